@@ -0,0 +1,72 @@
+"""Measure how long the postdmarc module and command line take to start.
+
+Each case is run in a fresh interpreter and the median wall time is reported:
+
+    python benchmarks/startup.py --runs 20
+
+Pass --budget to exit with an error when any case is slower than that many
+milliseconds, to catch startup regressions in CI.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = {
+    "import postdmarc.postdmarc": ["-c", "import postdmarc.postdmarc"],
+    "import postdmarc.fleet": ["-c", "import postdmarc.fleet"],
+    "postdmarc query (offline)": ["-m", "postdmarc.postdmarc", "query"],
+}
+
+
+def time_case(args, runs, env):
+    """Return the wall time of each run of the interpreter with `args`, in ms."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable] + args,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    """Run every case and print the median and fastest startup times."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=None, help="milliseconds")
+    options = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, POSTMARK_API_KEY="benchmark")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    baseline = statistics.median(time_case(["-c", "pass"], options.runs, env))
+    print(f"{'python -c pass':32} {baseline:8.1f} ms")
+
+    slow = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = os.path.join(tmp, "reports.db")
+        for name, args in CASES.items():
+            if args[-1] == "query":
+                args = args + ["--store_path", store_path]
+            timings = time_case(args, options.runs, env)
+            median = statistics.median(timings)
+            print(f"{name:32} {median:8.1f} ms (fastest {min(timings):.1f} ms)")
+            if options.budget is not None and median > options.budget:
+                slow.append(name)
+
+    if slow:
+        sys.exit(f"Slower than {options.budget} ms: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Measure pagination, export and parsing throughput against the mock DMARC API.
+
+The mock server runs in its own process, so it doesn't compete with the client for
+the GIL. Save the results of a run and compare a later run against them:
+
+    python benchmarks/throughput.py --output before.json
+    python benchmarks/throughput.py --compare before.json
+
+Use --latency to simulate the round trip time to the real API. To measure the gain
+of a JSON backend, compare a run with the standard library against one with orjson:
+
+    python benchmarks/throughput.py --json_backend json --output stdlib.json
+    python benchmarks/throughput.py --json_backend orjson --compare stdlib.json
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from postdmarc.json_backend import JSON_BACKENDS, get_backend  # noqa: E402
+from postdmarc.mock_server import API_KEY, MockConfig, MockDmarcApi  # noqa: E402
+from postdmarc.postdmarc import PostDmarc  # noqa: E402
+from postdmarc.writers import flatten_report  # noqa: E402
+from postdmarc.xml_report import iter_xml_records  # noqa: E402
+
+
+def start_server(options):
+    """Start the mock server in a subprocess, returning the process and its URL."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "postdmarc.mock_server",
+            "--port",
+            "0",
+            "--reports",
+            str(options.reports),
+            "--records_per_report",
+            str(options.records),
+            "--latency",
+            str(options.latency),
+        ],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = process.stdout.readline().split()[-1]
+    return process, url
+
+
+def timed(function):
+    """Call `function`, returning its result and the seconds it took."""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def bench_pagination(client):
+    """List every report, page by page."""
+    entries, seconds = timed(lambda: sum(1 for _ in client.iter_reports(limit=50)))
+    return {"seconds": seconds, "items": entries, "unit": "entries"}
+
+
+def bench_export(client, concurrency, output_format):
+    """Export every report to a temporary file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, f"reports.{output_format}")
+        _, seconds = timed(
+            lambda: client.export_all_reports(
+                "2000-01-01",
+                "2100-01-01",
+                filepath,
+                concurrency=concurrency,
+                output_format=output_format,
+            )
+        )
+        size = os.path.getsize(filepath)
+    return {
+        "seconds": seconds,
+        "items": client.request_metrics()["GET /records/my/reports/{id}"]["requests"],
+        "unit": "reports",
+        "bytes": size,
+    }
+
+
+def bench_parse_json(api, reports, backend):
+    """Decode report bodies and flatten their records."""
+    bodies = [api.render_report(id, False) for id in range(1, reports + 1)]
+    rows, seconds = timed(
+        lambda: sum(
+            sum(1 for _ in flatten_report(backend.loads(body))) for body in bodies
+        )
+    )
+    return {"seconds": seconds, "items": rows, "unit": "records"}
+
+
+def bench_encode_json(api, reports, backend):
+    """Serialize decoded reports, as the JSON exports do."""
+    decoded = [json.loads(api.render_report(id, False)) for id in range(1, reports + 1)]
+    size, seconds = timed(lambda: sum(len(backend.dumps(report)) for report in decoded))
+    return {"seconds": seconds, "items": reports, "unit": "reports", "bytes": size}
+
+
+def bench_parse_xml(api, reports):
+    """Parse the records of aggregate report XML documents."""
+    bodies = [api.render_report(id, True) for id in range(1, reports + 1)]
+    records, seconds = timed(
+        lambda: sum(
+            sum(1 for _ in iter_xml_records(io.BytesIO(body))) for body in bodies
+        )
+    )
+    return {"seconds": seconds, "items": records, "unit": "records"}
+
+
+def main():
+    """Run every benchmark, print the rates and optionally compare to a saved run."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=500)
+    parser.add_argument("--records", type=int, default=20, help="records per report")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--json_backend", choices=JSON_BACKENDS, default="auto")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare to results saved with --output")
+    options = parser.parse_args()
+
+    backend = get_backend(options.json_backend)
+    results = {}
+    process, url = start_server(options)
+    try:
+        client = PostDmarc(API_KEY, endpoint=url, json_backend=backend.name)
+        results["pagination"] = bench_pagination(client)
+        for concurrency in options.concurrency:
+            for output_format in ("jsonl", "csv"):
+                client = PostDmarc(API_KEY, endpoint=url, json_backend=backend.name)
+                results[f"export {output_format} concurrency={concurrency}"] = (
+                    bench_export(client, concurrency, output_format)
+                )
+    finally:
+        process.terminate()
+        process.wait()
+
+    api = MockDmarcApi(MockConfig(records_per_report=options.records))
+    results["parse json"] = bench_parse_json(api, min(options.reports, 200), backend)
+    results["encode json"] = bench_encode_json(api, min(options.reports, 200), backend)
+    results["parse xml"] = bench_parse_xml(api, min(options.reports, 200))
+
+    previous = {}
+    if options.compare:
+        with open(options.compare) as f:
+            previous = json.load(f)["results"]
+    for name, result in results.items():
+        rate = result["items"] / result["seconds"]
+        line = f"{name:32} {rate:12.1f} {result['unit']}/s"
+        if "bytes" in result:
+            line += f" {result['bytes'] / result['seconds'] / 2**20:8.2f} MiB/s"
+        if name in previous:
+            before = previous[name]["items"] / previous[name]["seconds"]
+            line += f" ({(rate / before - 1) * 100:+.1f}%)"
+        print(line)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump({"options": vars(options), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Provide an asyncio wrapper for the Postmark DMARC API.
+
+Requires the optional httpx dependency: pip install py-postdmarc[async]
+"""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from postdmarc import pdm_exceptions as errors
+from postdmarc import writers
+from postdmarc.postdmarc import (
+    API_ENDPOINT,
+    DEFAULT_TIMEOUT,
+    PostDmarc,
+    ResponseTuple,
+    format_date,
+)
+from postdmarc.retry import RetryPolicy
+
+
+class AsyncPostDmarc:
+    """Asynchronous connection object to the Postmark DMARC API.
+
+    Mirrors every method of PostDmarc as a coroutine, so many domains can be polled
+    from a single event loop, with one client per domain. Close the underlying
+    connection pool with `aclose`, or use the object as an async context manager.
+    """
+
+    # API key loading and status code mapping are shared with the blocking client
+    get_api_key = PostDmarc.get_api_key
+    check_response = PostDmarc.check_response
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = 100,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+        endpoint: str = API_ENDPOINT,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Initialize object with default values.
+
+        Keyword Arguments:
+        api_key         The API key of the record. Loaded from the POSTMARK_API_KEY
+                            environment variable or the PM_API.key file by default.
+        max_connections Maximum number of connections open at once. (default 100)
+        max_attempts    Number of times to try a request before giving up on
+                            rate limiting, server errors and connection errors.
+                            (default 3)
+        backoff         Seconds to wait before the first retry, doubling with each
+                            further attempt. (default 0.5)
+        endpoint        Base URL of the API, such as that of a local mock server.
+                            (default https://dmarc.postmarkapp.com)
+        timeout         Seconds to wait for the API to accept a connection or send
+                            more of a response before the attempt fails, to be
+                            retried like a connection error. (default 10)
+        """
+        if httpx is None:
+            raise ImportError(
+                "AsyncPostDmarc requires httpx. "
+                "Install it with 'pip install py-postdmarc[async]'."
+            )
+        self.api_key = api_key if api_key is not None else self.get_api_key()
+        self.endpoint = endpoint.rstrip("/")
+        self.retry_policy = RetryPolicy(max_attempts=max_attempts, backoff=backoff)
+        self.client = httpx.AsyncClient(
+            headers={"Accept": "application/json"},
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=timeout,
+        )
+
+    async def __aenter__(self) -> "AsyncPostDmarc":
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the connection pool on leaving the async context manager."""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+        await self.client.aclose()
+
+    async def _request(
+        self, method: str, endpoint_path: str, **kwargs
+    ) -> "httpx.Response":
+        """Send a request, retrying transient failures according to the retry policy.
+
+        Follows the same policy as PostDmarc, waiting without blocking the event loop.
+        """
+        send = getattr(self.client, method)
+        attempt = 1
+        while True:
+            try:
+                response = await send(self.endpoint + endpoint_path, **kwargs)
+            except httpx.TransportError:
+                if attempt >= self.retry_policy.max_attempts:
+                    raise
+                if not self.retry_policy.should_retry(method):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                if attempt >= self.retry_policy.max_attempts:
+                    return response
+                if not self.retry_policy.should_retry(method, response.status_code):
+                    return response
+                delay = self.retry_policy.delay(
+                    attempt, response.headers.get("Retry-After")
+                )
+                if delay > self.retry_policy.max_retry_after:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @property
+    def auth_headers(self) -> dict:
+        """Headers required by the authenticated endpoints."""
+        return {"X-Api-Token": self.api_key}
+
+    async def create_record(self, email: str, domain: str) -> ResponseTuple:
+        """Create a new DMARC record for a given domain and email."""
+        endpoint_path = "/records"
+        body = {"email": email, "domain": domain}
+        response = await self._request("post", endpoint_path, json=body)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def get_record(self) -> ResponseTuple:
+        """Get a record’s information."""
+        endpoint_path = "/records/my"
+        response = await self._request("get", endpoint_path, headers=self.auth_headers)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def update_record(self, email: str) -> ResponseTuple:
+        """Update a record’s information."""
+        endpoint_path = "/records/patch"
+        body = {"email": email}
+        response = await self._request(
+            "patch", endpoint_path, json=body, headers=self.auth_headers
+        )
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def get_dns_snippet(self) -> ResponseTuple:
+        """Get generated DMARC DNS record name and value."""
+        endpoint_path = "/records/my/dns"
+        response = await self._request("get", endpoint_path, headers=self.auth_headers)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def verify_dns(self) -> ResponseTuple:
+        """Verify if your DMARC DNS record exists."""
+        endpoint_path = "/records/my/verify"
+        response = await self._request("post", endpoint_path, headers=self.auth_headers)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def delete_record(self) -> ResponseTuple:
+        """Delete a record.
+
+        Deleting a record will stop processing data for this domain.
+        The email associated with this record will also be unsubscribed from the DMARC
+        weekly digests for this domain only.
+        """
+        endpoint_path = "/records/my"
+        response = await self._request(
+            "delete", endpoint_path, headers=self.auth_headers
+        )
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def list_reports(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: int = None,
+        after: int = None,
+        before: int = None,
+        reverse: bool = None,
+    ) -> ResponseTuple:
+        """List all received DMARC reports for a given domain.
+
+        See PostDmarc.list_reports for a description of the keyword arguments.
+        """
+        endpoint_path = "/records/my/reports"
+        params = {
+            "from_date": format_date(from_date),
+            "to_date": format_date(to_date),
+            "limit": limit,
+            "after": after,
+            "before": before,
+            "reverse": reverse,
+        }
+
+        params = {key: value for key, value in params.items() if value is not None}
+
+        response = await self._request(
+            "get", endpoint_path, params=params, headers=self.auth_headers
+        )
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def iter_reports(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        """Yield report listing entries, following the pagination cursor.
+
+        Only one page of entries is held at a time, and breaking out of the loop stops
+        any further page from being requested.
+        """
+        async for entries, _ in self._iter_pages(
+            from_date=from_date, to_date=to_date, limit=limit, after=after
+        ):
+            for entry in entries:
+                yield entry
+
+    async def iter_report_details(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+        concurrency: int = 1,
+    ) -> AsyncIterator[ResponseTuple]:
+        """Yield the full details of every listed report, in order of report ID.
+
+        Reports are downloaded a page at a time, `concurrency` reports at once.
+        """
+        pages = self._iter_pages(
+            from_date=from_date, to_date=to_date, limit=limit, after=after
+        )
+        async for reports, _ in self._iter_detail_pages(pages, concurrency):
+            for report in reports:
+                yield report
+
+    async def _iter_pages(
+        self, after: Optional[int] = None, **params
+    ) -> AsyncIterator[Tuple[List[dict], Optional[int]]]:
+        """Yield the entries of each listing page with the cursor of the next page."""
+        while True:
+            page = await self.list_reports(after=after, **params)
+            after = page.json["meta"]["next"]
+            yield page.json["entries"], after
+            if after is None:
+                return
+
+    async def _iter_detail_pages(
+        self,
+        pages: AsyncIterator[Tuple[List[dict], Optional[int]]],
+        concurrency: int,
+    ) -> AsyncIterator[Tuple[List[ResponseTuple], Optional[int]]]:
+        """Download the full reports of each listing page.
+
+        Yields the reports of each page with the cursor of the next page.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(ident: int) -> ResponseTuple:
+            async with semaphore:
+                return await self.get_report(ident)
+
+        async for entries, after in pages:
+            # gather returns results in submission order, so reports stay sorted by ID
+            reports = await asyncio.gather(*(fetch(entry["id"]) for entry in entries))
+            yield reports, after
+
+    async def get_report(self, id: int, fmt: str = "json") -> ResponseTuple:
+        """Load full DMARC report details.
+
+        Load full DMARC report details as a raw DMARC XML document, returned as a
+        string, or as our own JSON representation.
+        """
+        if fmt not in ("json", "xml"):
+            raise errors.BadRequestError(
+                f"Format keyword must be either 'json' or 'xml', not {fmt}."
+            )
+
+        endpoint_path = f"/records/my/reports/{id}"
+        response = await self._request(
+            "get",
+            endpoint_path,
+            headers={**self.auth_headers, "Accept": f"application/{fmt}"},
+        )
+        self.check_response(response)
+        if fmt == "xml":
+            return ResponseTuple(response.status_code, response.text)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def export_all_reports(
+        self,
+        from_date: Union[str, datetime],
+        to_date: Union[str, datetime],
+        filepath: str,
+        concurrency: int = 1,
+        output_format: str = "json",
+    ) -> None:
+        """Query for all forensic reports in a date range and export to a json file.
+
+        See PostDmarc.export_all_reports for a description of the arguments. Unlike the
+        blocking client, no checkpoint is kept, so the export cannot be resumed.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+        if output_format not in writers.EXPORT_FORMATS:
+            raise ValueError(
+                f"Output format must be one of {sorted(writers.EXPORT_FORMATS)}, "
+                f"not {output_format}."
+            )
+
+        pages = self._iter_pages(from_date=from_date, to_date=to_date)
+        with writers.open_export(filepath, output_format) as f:
+            writer = writers.EXPORT_FORMATS[output_format](f)
+            async for reports, _ in self._iter_detail_pages(pages, concurrency):
+                for report in reports:
+                    writer.write(report)
+                f.flush()
+            writer.close()
+
+    async def recover_token(self, owner: str) -> ResponseTuple:
+        """Initiate API token recovery for a domain.
+
+        This endpoint is public and doesn't require authentication.
+        """
+        endpoint_path = "/tokens/recover"
+        body = {"owner": owner}
+        response = await self._request("post", endpoint_path, json=body)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
+
+    async def rotate_token(self) -> ResponseTuple:
+        """Generate a new API token and replace your existing one with it."""
+        endpoint_path = "/records/my/token/rotate"
+        response = await self._request("post", endpoint_path, headers=self.auth_headers)
+        self.check_response(response)
+        return ResponseTuple(response.status_code, response.json())
@@ -0,0 +1,126 @@
+"""Persistent on-disk cache of downloaded DMARC reports."""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ReportCache:
+    """SQLite-backed cache of full DMARC reports, keyed by report ID.
+
+    Reports never change once they have been received, so cached entries never go
+    stale. When the total size of the cached reports exceeds `max_bytes`, the least
+    recently used reports are evicted.
+
+    Reading a report doesn't write to the database. Access times are kept in memory
+    and written along with the next report stored, or by `flush` and `close`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2**30) -> None:
+        """Open, or create, the cache database at `path`."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Access times of cache hits not yet written to the database, by report ID
+        self.accessed: Dict[int, float] = {}
+        # The connection is shared by export worker threads, guarded by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "id INTEGER PRIMARY KEY, body TEXT NOT NULL, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS reports_accessed ON reports (accessed)"
+        )
+        self.connection.commit()
+        (self.size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM reports"
+        ).fetchone()
+
+    def get(self, id: int) -> Optional[dict]:
+        """Return the cached report, or None if it has not been cached."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body FROM reports WHERE id = ?", (id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.accessed[id] = time.time()
+        return json.loads(row[0])
+
+    def put(self, id: int, report: dict) -> None:
+        """Store a report, evicting the least recently used ones if necessary."""
+        body = json.dumps(report)
+        size = len(body)
+        with self.lock:
+            previous = self.connection.execute(
+                "SELECT size FROM reports WHERE id = ?", (id,)
+            ).fetchone()
+            if previous is not None:
+                self.size -= previous[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)",
+                (id, body, size, time.time()),
+            )
+            self.accessed.pop(id, None)
+            self.size += size
+            # Eviction needs the latest access times to find the least recently used
+            self.write_accessed()
+            self.evict()
+            self.connection.commit()
+
+    def write_accessed(self) -> None:
+        """Write the access times of recent cache hits, without committing them."""
+        if self.accessed:
+            self.connection.executemany(
+                "UPDATE reports SET accessed = ? WHERE id = ?",
+                [(accessed, id) for id, accessed in self.accessed.items()],
+            )
+            self.accessed.clear()
+
+    def flush(self) -> None:
+        """Save the access times of recent cache hits, if there are any."""
+        with self.lock:
+            if not self.accessed:
+                return None
+            self.write_accessed()
+            self.connection.commit()
+
+    def evict(self) -> None:
+        """Delete least recently used reports until the cache fits in `max_bytes`."""
+        while self.size > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT id, size FROM reports ORDER BY accessed LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for id, size in rows:
+                self.connection.execute("DELETE FROM reports WHERE id = ?", (id,))
+                self.size -= size
+                if self.size <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        """Return hit and miss counts along with the current size of the cache."""
+        with self.lock:
+            (entries,) = self.connection.execute(
+                "SELECT COUNT(*) FROM reports"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": self.size,
+        }
+
+    def close(self) -> None:
+        """Save the access times of recent cache hits and close the database."""
+        self.flush()
+        self.connection.close()
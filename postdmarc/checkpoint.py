@@ -0,0 +1,94 @@
+"""Persist the progress of a report export so that it can be resumed."""
+
+import json
+import os
+from typing import Any, Iterable, Optional
+
+
+class ExportCheckpoint:
+    """Progress of an export, stored in a file next to the exported file.
+
+    The checkpoint records the listing cursor of the next page to request, and the
+    size of the output file at that point, so a resumed export can discard any
+    partially written data and continue from there. Saving it costs the same for the
+    last page of an export as for the first. A cursor of None after a page means the
+    listing is finished, which is saved as `finished` so that a resumed export only
+    has to finish off the file, rather than list every report again.
+
+    Sharded listings have no single cursor. With `track_ids`, the IDs of the reports
+    already written are appended to a log next to the checkpoint instead, which a
+    resumed export loads to skip them.
+    """
+
+    def __init__(self, filepath: str, track_ids: bool = False, **query: Any) -> None:
+        """Create an empty checkpoint for an export of `query` to `filepath`."""
+        self.path = f"{filepath}.checkpoint"
+        self.ids_path = f"{self.path}.ids"
+        self.track_ids = track_ids
+        self.query = query
+        self.after: Optional[int] = None
+        self.finished = False
+        self.fetched: set = set()
+        self.offset = 0
+        self.count = 0
+        self.ids_offset = 0
+
+    def load(self) -> bool:
+        """Load saved progress, returning False if there is no checkpoint to load."""
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        if state["query"] != self.query:
+            raise ValueError(
+                f"The checkpoint at {self.path} belongs to a different export: "
+                f"{state['query']}"
+            )
+        self.after = state["after"]
+        self.finished = state.get("finished", False)
+        self.offset = state["offset"]
+        self.count = state["count"]
+        self.ids_offset = state.get("ids_offset", 0)
+        if self.track_ids and self.ids_offset:
+            # IDs logged after the checkpoint was saved belong to discarded data
+            with open(self.ids_path, "rb") as f:
+                logged = f.read(self.ids_offset)
+            self.fetched = {int(line) for line in logged.split()}
+        return True
+
+    def update(
+        self, after: Optional[int], ids: Iterable[int], offset: int, count: int
+    ) -> None:
+        """Record a finished page of reports and save the checkpoint."""
+        self.after = after
+        # Sharded listings have no cursor, so their pages never finish the listing
+        self.finished = not self.track_ids and after is None
+        self.offset = offset
+        self.count = count
+        if self.track_ids:
+            with open(self.ids_path, "ab") as f:
+                f.truncate(self.ids_offset)
+                f.write("".join(f"{id}\n" for id in ids).encode())
+                self.ids_offset = f.tell()
+
+        state = {
+            "query": self.query,
+            "after": self.after,
+            "finished": self.finished,
+            "offset": self.offset,
+            "count": self.count,
+            "ids_offset": self.ids_offset,
+        }
+        # Write to a temporary file first so a crash never leaves a corrupt checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        """Delete the checkpoint once the export has finished."""
+        for path in (self.path, self.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,122 @@
+"""Local lookups of DMARC DNS records, to check them before asking the API.
+
+The default resolver requires the optional dnspython dependency:
+pip install py-postdmarc[dns]
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+# Returns the TXT records of a DNS name, or an empty list if it has none
+Resolver = Callable[[str], List[str]]
+
+# Outcomes of a local check. A record that sends aggregate reports to Postmark either
+# matches the generated one exactly, or differs in other tags, such as a stricter
+# policy or a second report address. A "mismatch" doesn't report to Postmark at all.
+MATCH = "match"
+DIFFERENT = "different"
+MISMATCH = "mismatch"
+MISSING = "missing"
+UNKNOWN = "unknown"
+# Outcomes worth verifying with the API; the others can't pass until the DNS record
+# is fixed
+VERIFIABLE = (MATCH, DIFFERENT, UNKNOWN)
+
+
+class DnsCheck(NamedTuple):
+    """Outcome of comparing the published DMARC record of a domain to the expected one.
+
+    `found` holds the DMARC records published at `name`, and `error` describes why the
+    lookup failed when the status is "unknown".
+    """
+
+    name: str
+    expected: str
+    found: List[str]
+    status: str
+    error: Optional[str] = None
+
+
+def default_resolver() -> Resolver:
+    """Return a resolver looking up TXT records with dnspython."""
+    try:
+        import dns.resolver
+    except ImportError:
+        raise ImportError(
+            "Checking DNS records locally requires dnspython. "
+            "Install it with 'pip install py-postdmarc[dns]'."
+        )
+
+    def resolve_txt(name: str) -> List[str]:
+        try:
+            answer = dns.resolver.resolve(name, "TXT")
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return []
+        return [b"".join(rdata.strings).decode() for rdata in answer]
+
+    return resolve_txt
+
+
+def unquote_record(value: str) -> str:
+    """Return a TXT record value as DNS serves it, without zone file quoting.
+
+    Snippets such as that of get_dns_snippet wrap the value in escaped quotes, and
+    long values may be split into several quoted strings, which DNS joins.
+    """
+    value = value.strip().replace('\\"', '"')
+    strings = re.findall(r'"([^"]*)"', value)
+    return "".join(strings) if strings else value
+
+
+def parse_tags(record: str) -> Dict[str, str]:
+    """Split a DMARC record into its tags, ignoring whitespace and tag order."""
+    tags = {}
+    for tag in record.split(";"):
+        key, separator, value = tag.partition("=")
+        if separator:
+            tags[key.strip().lower()] = value.strip()
+    return tags
+
+
+def report_addresses(tags: Dict[str, str]) -> Set[str]:
+    """Return the aggregate report URIs of a DMARC record, without size limits."""
+    return {
+        uri.strip().split("!")[0].lower()
+        for uri in tags.get("rua", "").split(",")
+        if uri.strip()
+    }
+
+
+def check_dmarc_record(name: str, expected: str, resolver: Resolver) -> DnsCheck:
+    """Look up the DMARC record published at `name` and compare it to `expected`.
+
+    The record passes if its aggregate report addresses include those of `expected`.
+    It matches when it also holds the same other tags with the same values, and is
+    "different" otherwise. A domain must publish exactly one DMARC record, so several
+    records are a mismatch. `expected` may be quoted as in a zone file.
+    """
+    expected = unquote_record(expected)
+    try:
+        records = resolver(name)
+    except Exception as error:
+        return DnsCheck(name, expected, [], UNKNOWN, f"{type(error).__name__}: {error}")
+
+    found = [
+        record
+        for record in records
+        if parse_tags(record).get("v", "").upper() == "DMARC1"
+    ]
+    expected_tags = parse_tags(expected)
+    if not found:
+        status = MISSING
+    elif len(found) > 1:
+        status = MISMATCH
+    else:
+        tags = parse_tags(found[0])
+        if not report_addresses(expected_tags) <= report_addresses(tags):
+            status = MISMATCH
+        elif tags == expected_tags:
+            status = MATCH
+        else:
+            status = DIFFERENT
+    return DnsCheck(name, expected, found, status)
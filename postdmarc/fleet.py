@@ -0,0 +1,186 @@
+"""Run Postmark DMARC API calls across many domains at once."""
+
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, NamedTuple, Optional, Union
+
+from postdmarc.dns_check import VERIFIABLE, DnsCheck, Resolver, default_resolver
+from postdmarc.postdmarc import PostDmarc, ResponseTuple
+
+
+class FleetResult(NamedTuple):
+    """Container for the per-domain results of a fleet-wide call.
+
+    Domains whose call raised an exception are listed in `errors` instead of
+    `results`, so one failing domain doesn't abort the others.
+    """
+
+    results: Dict[str, Any]
+    errors: Dict[str, Exception]
+
+
+class DnsVerification(NamedTuple):
+    """Container for the local check of a domain's DNS record and its verification.
+
+    The API response is None when the local check showed that verification would fail.
+    """
+
+    check: DnsCheck
+    response: Optional[ResponseTuple]
+
+
+def load_config(config_path: str) -> Dict[str, str]:
+    """Load a JSON object mapping each domain to the API key of its record."""
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    if not isinstance(config, dict) or not all(
+        isinstance(key, str) for key in config.values()
+    ):
+        raise ValueError(
+            f"{config_path} must contain a JSON object mapping domains to API keys."
+        )
+    return config
+
+
+class PostDmarcFleet:
+    """Connection objects to the Postmark DMARC API for many domains.
+
+    Every domain gets its own PostDmarc client, and so its own connection pool. Calls
+    are made for all domains concurrently and return a FleetResult keyed by domain.
+    """
+
+    def __init__(self, config_path: str, concurrency: int = 16, **options: Any) -> None:
+        """Create a client per domain of the config file.
+
+        Arguments:
+        config_path The JSON file mapping each domain to its API key.
+
+        Keyword Arguments:
+        concurrency Number of domains to call at the same time. (default 16)
+        options     Any other keyword arguments are passed on to every PostDmarc.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+        self.concurrency = concurrency
+        self.clients = {
+            domain: PostDmarc(api_key=api_key, **options)
+            for domain, api_key in load_config(config_path).items()
+        }
+
+    def _run(self, call: Callable[[str, PostDmarc], Any]) -> FleetResult:
+        """Call `call(domain, client)` for every domain concurrently."""
+        result = FleetResult({}, {})
+        if not self.clients:
+            return result
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(self.clients))
+        ) as executor:
+            futures = {
+                domain: executor.submit(call, domain, client)
+                for domain, client in self.clients.items()
+            }
+        for domain, future in futures.items():
+            try:
+                result.results[domain] = future.result()
+            except Exception as error:
+                result.errors[domain] = error
+        return result
+
+    def get_record(self) -> FleetResult:
+        """Get the record of every domain."""
+        return self._run(lambda domain, client: client.get_record())
+
+    def get_dns_snippet(self) -> FleetResult:
+        """Get the generated DMARC DNS record name and value of every domain."""
+        return self._run(lambda domain, client: client.get_dns_snippet())
+
+    def verify_dns(
+        self, precheck: bool = False, resolver: Optional[Resolver] = None
+    ) -> FleetResult:
+        """Verify if the DMARC DNS record of every domain exists.
+
+        With a precheck, the result of each domain is a DnsVerification, and the API
+        only verifies the domains whose record reports to Postmark, or whose record
+        couldn't be looked up.
+
+        Keyword Arguments:
+        precheck    First look up the record of every domain locally, skipping the
+                        API verification of records that are missing or don't send
+                        aggregate reports to Postmark. (default false)
+        resolver    Function returning the TXT records of a DNS name, for the
+                        precheck. (default uses the optional dnspython dependency)
+        """
+        if not precheck:
+            return self._run(lambda domain, client: client.verify_dns())
+
+        if resolver is None:
+            resolver = default_resolver()
+
+        def verify(domain: str, client: PostDmarc) -> DnsVerification:
+            check = client.check_dns(resolver)
+            if check.status not in VERIFIABLE:
+                return DnsVerification(check, None)
+            return DnsVerification(check, client.verify_dns())
+
+        return self._run(verify)
+
+    def list_reports(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+    ) -> FleetResult:
+        """List the received DMARC reports of every domain.
+
+        See PostDmarc.list_reports for a description of the keyword arguments.
+        """
+        return self._run(
+            lambda domain, client: client.list_reports(from_date, to_date, limit)
+        )
+
+    def export_all_reports(
+        self,
+        from_date: Union[str, datetime],
+        to_date: Union[str, datetime],
+        filepath: str,
+        **options: Any,
+    ) -> FleetResult:
+        """Export the reports of every domain in a date range to a file per domain.
+
+        The result of each domain is the name of the file it was exported to.
+
+        Arguments:
+        from_date   Only include reports received on this date or after.
+        to_date     Only include reports received before this date.
+        filepath    The file name to export to, with "{domain}" in place of the
+                        domain name, such as "reports-{domain}.json".
+
+        Keyword Arguments:
+        options     Passed on to PostDmarc.export_all_reports.
+        """
+        if "{domain}" not in filepath:
+            raise ValueError(
+                f"The file name must contain '{{domain}}' to export each domain to "
+                f"its own file, not {filepath}."
+            )
+
+        def export(domain: str, client: PostDmarc) -> str:
+            domain_filepath = filepath.format(domain=domain)
+            client.export_all_reports(from_date, to_date, domain_filepath, **options)
+            return domain_filepath
+
+        return self._run(export)
+
+
+def main() -> None:
+    """Run the fleet command line interface."""
+    import fire
+
+    fire.Fire(PostDmarcFleet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Interchangeable JSON libraries for decoding responses and writing exports.
+
+orjson decodes and encodes large reports several times faster than the standard
+library. It is used when installed, with the standard library as the fallback:
+pip install py-postdmarc[orjson]
+"""
+
+import json
+from typing import Any, Callable, NamedTuple, Union
+
+# Names accepted by get_backend. "auto" picks orjson if it is installed.
+JSON_BACKENDS = ("auto", "orjson", "json")
+
+
+class JsonBackend(NamedTuple):
+    """Functions of a JSON library, with a common signature.
+
+    `loads` accepts str or bytes, so response bodies can be decoded without first
+    being decoded to text. `dumps` returns compact str for text files.
+    """
+
+    name: str
+    loads: Callable[[Union[str, bytes]], Any]
+    dumps: Callable[[Any], str]
+
+
+def orjson_backend() -> JsonBackend:
+    """Return the orjson backend, raising ImportError if it isn't installed."""
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError(
+            "The orjson JSON backend requires orjson. "
+            "Install it with 'pip install py-postdmarc[orjson]'."
+        )
+
+    def dumps(obj: Any) -> str:
+        # orjson only serializes plain tuples, not NamedTuples such as ResponseTuple
+        return orjson.dumps(obj, default=tuple).decode()
+
+    return JsonBackend("orjson", orjson.loads, dumps)
+
+
+STDLIB_BACKEND = JsonBackend("json", json.loads, json.dumps)
+
+
+def get_backend(name: str = "auto") -> JsonBackend:
+    """Return the JSON backend called `name`, one of JSON_BACKENDS."""
+    if name not in JSON_BACKENDS:
+        raise ValueError(
+            f"JSON backend must be one of {list(JSON_BACKENDS)}, not {name}."
+        )
+    if name == "json":
+        return STDLIB_BACKEND
+    try:
+        return orjson_backend()
+    except ImportError:
+        if name == "orjson":
+            raise
+        return STDLIB_BACKEND
@@ -0,0 +1,176 @@
+"""Instrumentation of the requests sent to the Postmark DMARC API."""
+
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+# Path segments that identify a single resource, such as a report ID
+RESOURCE_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_template(endpoint_path: str) -> str:
+    """Replace resource IDs in a path, so that all reports share one endpoint."""
+    return RESOURCE_ID.sub("/{id}", endpoint_path)
+
+
+class RequestEvent(NamedTuple):
+    """Outcome of a single attempt at a request, passed to the response hooks.
+
+    `status_code` is None when the request failed without a response, in which case
+    `error` holds the exception. `attempt` counts from 1, so any later attempt is a
+    retry. `bytes_received` is the Content-Length of the response, or the size of its
+    body if the header is missing and the body was read.
+    """
+
+    method: str
+    endpoint: str
+    attempt: int
+    status_code: Optional[int]
+    seconds: float
+    bytes_received: int
+    error: Optional[BaseException] = None
+
+
+class EndpointStats:
+    """Counters of the requests sent to one endpoint with one method."""
+
+    __slots__ = ("requests", "retries", "errors", "statuses", "bytes", "buckets", "sum")
+
+    def __init__(self) -> None:
+        """Start all counters at zero."""
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+
+    def add(self, event: RequestEvent) -> None:
+        """Count a request attempt."""
+        self.requests += 1
+        self.retries += event.attempt > 1
+        if event.status_code is None:
+            self.errors += 1
+        else:
+            self.statuses[event.status_code] = (
+                self.statuses.get(event.status_code, 0) + 1
+            )
+        self.bytes += event.bytes_received
+        self.sum += event.seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if event.seconds <= bound:
+                self.buckets[index] += 1
+                break
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a latency quantile as the upper bound of the bucket holding it."""
+        if not self.requests:
+            return None
+        rank = q * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+
+class RequestMetrics:
+    """Per endpoint request counts, latency histograms, bytes received and retries.
+
+    Add it as a response hook of a PostDmarc client, which every client does by
+    default. Safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        """Create empty metrics."""
+        self.endpoints: Dict[Tuple[str, str], EndpointStats] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent) -> None:
+        """Count a request attempt, as a response hook."""
+        key = (event.method.upper(), event.endpoint)
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.add(event)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counters of each endpoint, keyed by "METHOD /path"."""
+        with self.lock:
+            return {
+                f"{method} {endpoint}": {
+                    "requests": stats.requests,
+                    "retries": stats.retries,
+                    "errors": stats.errors,
+                    "statuses": dict(stats.statuses),
+                    "bytes_received": stats.bytes,
+                    "seconds_total": round(stats.sum, 6),
+                    "seconds_mean": round(stats.sum / stats.requests, 6),
+                    "seconds_p50": stats.quantile(0.5),
+                    "seconds_p95": stats.quantile(0.95),
+                }
+                for (method, endpoint), stats in sorted(self.endpoints.items())
+            }
+
+    def prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format.
+
+        Requests that failed without a response are counted with status "error".
+        """
+        with self.lock:
+            endpoints = [
+                (f'method="{method}",endpoint="{endpoint}"', stats)
+                for (method, endpoint), stats in sorted(self.endpoints.items())
+            ]
+            lines = prometheus_header(
+                "requests_total", "counter", "Requests sent, including retries."
+            )
+            for labels, stats in endpoints:
+                counts = sorted(stats.statuses.items()) + [("error", stats.errors)]
+                for status, count in counts:
+                    if count:
+                        lines.append(
+                            f'postdmarc_requests_total{{{labels},status="{status}"}} '
+                            f"{count}"
+                        )
+
+            lines += prometheus_header(
+                "retries_total", "counter", "Requests that were retries."
+            )
+            for labels, stats in endpoints:
+                lines.append(f"postdmarc_retries_total{{{labels}}} {stats.retries}")
+
+            lines += prometheus_header(
+                "response_bytes_total", "counter", "Bytes received in responses."
+            )
+            for labels, stats in endpoints:
+                lines.append(
+                    f"postdmarc_response_bytes_total{{{labels}}} {stats.bytes}"
+                )
+
+            name = "postdmarc_request_duration_seconds"
+            lines += prometheus_header(
+                "request_duration_seconds", "histogram", "Latency of each request."
+            )
+            for labels, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {stats.sum}")
+                lines.append(f"{name}_count{{{labels}}} {stats.requests}")
+        return "\n".join(lines) + "\n"
+
+
+def prometheus_header(name: str, kind: str, description: str) -> List[str]:
+    """Return the HELP and TYPE lines of a Prometheus metric family."""
+    return [
+        f"# HELP postdmarc_{name} {description}",
+        f"# TYPE postdmarc_{name} {kind}",
+    ]
@@ -0,0 +1,360 @@
+"""Local stand-in for the Postmark DMARC API, for benchmarks and integration tests.
+
+Serves a record, its DNS snippet and any number of synthetic DMARC reports, with
+pagination through meta.next, optional latency and injected server errors:
+
+    python -m postdmarc.mock_server --reports 10000 --latency 0.02 --error_rate 0.01
+
+Point a client at it with PostDmarc(api_key=API_KEY, endpoint=server.url).
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+API_KEY = "mock-api-key"
+# The largest page the report listing returns
+MAX_PAGE_SIZE = 50
+ORGANIZATIONS = ("google.com", "yahoo.com", "outlook.com", "mail.ru", "zoho.com")
+DISPOSITIONS = ("none", "none", "none", "quarantine", "reject")
+RESULTS = ("pass", "pass", "pass", "fail")
+
+
+class MockConfig(NamedTuple):
+    """What the mock server serves, and how badly it behaves.
+
+    Reports are numbered from 1 and received `reports_per_day` a day from `start`.
+    A random fraction `error_rate` of the requests fails with `error_status`, after
+    `latency` seconds like every other request.
+    """
+
+    reports: int = 1000
+    records_per_report: int = 10
+    reports_per_day: int = 100
+    start: str = "2020-01-01"
+    latency: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    domain: str = "wildbit.com"
+    api_key: str = API_KEY
+    seed: int = 0
+
+
+class MockDmarcApi:
+    """The resources of the mock API, rendered as JSON or XML bodies."""
+
+    def __init__(self, config: MockConfig) -> None:
+        """Prepare to serve synthetic reports."""
+        self.config = config
+        self.start = datetime.strptime(config.start, "%Y-%m-%d")
+        self.random = random.Random(config.seed)
+        self.record = {
+            "domain": config.domain,
+            "public_token": "mock-public-token",
+            "created_at": f"{config.start}T00:00:00Z",
+            "reporting_uri": "mailto:re+mock@dmarc.postmarkapp.com",
+            "email": f"dmarc@{config.domain}",
+        }
+        self.dns_snippet = {
+            "value": "v=DMARC1; p=none; pct=100; "
+            "rua=mailto:re+mock@dmarc.postmarkapp.com; sp=none; aspf=r;",
+            "name": f"_dmarc.{config.domain}.",
+        }
+        # Cache rendered reports, since the same report is often requested again
+        self.render_report = lru_cache(maxsize=256)(self.render_report)
+
+    def received(self, id: int) -> datetime:
+        """Return when a report was received."""
+        day, position = divmod(id - 1, self.config.reports_per_day)
+        seconds = position * 86400 // self.config.reports_per_day
+        return self.start + timedelta(days=day, seconds=seconds)
+
+    def first_id(self, date: Optional[str]) -> int:
+        """Return the ID of the first report received on or after a date."""
+        if not date:
+            return 1
+        days = (datetime.strptime(date[:10], "%Y-%m-%d") - self.start).days
+        return max(days * self.config.reports_per_day + 1, 1)
+
+    def entry(self, id: int) -> Dict[str, Any]:
+        """Return the summary of a report shown in the listing."""
+        received = self.received(id)
+        begin = datetime(received.year, received.month, received.day) - timedelta(
+            days=1
+        )
+        return {
+            "id": id,
+            "domain": self.config.domain,
+            "date_range_begin": f"{begin:%Y-%m-%dT%H:%M:%S}Z",
+            "date_range_end": f"{begin + timedelta(seconds=86399):%Y-%m-%dT%H:%M:%S}Z",
+            "created_at": f"{received:%Y-%m-%dT%H:%M:%S}Z",
+            "external_id": f"mock-{id}",
+            "organization_name": ORGANIZATIONS[id % len(ORGANIZATIONS)],
+        }
+
+    def report(self, id: int) -> Dict[str, Any]:
+        """Return a full synthetic report, the same every time for the same ID."""
+        rng = random.Random(self.config.seed * 1000003 + id)
+        records = []
+        for _ in range(self.config.records_per_report):
+            records.append(
+                {
+                    "header_from": self.config.domain,
+                    "source_ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}."
+                    f"{rng.randrange(256)}",
+                    "source_ip_version": 4,
+                    "host_name": None,
+                    "count": rng.randrange(1, 1000),
+                    "policy_evaluated_spf": rng.choice(RESULTS),
+                    "policy_evaluated_dkim": rng.choice(RESULTS),
+                    "policy_evaluated_disposition": rng.choice(DISPOSITIONS),
+                    "policy_evaluated_reason_type": None,
+                    "spf_domain": self.config.domain,
+                    "spf_result": rng.choice(RESULTS),
+                    "dkim_domain": self.config.domain,
+                    "dkim_result": rng.choice(RESULTS),
+                }
+            )
+        return {**self.entry(id), "email": "noreply@example.com", "records": records}
+
+    def render_report(self, id: int, xml: bool) -> bytes:
+        """Return the body of a full report, as JSON or as aggregate report XML."""
+        report = self.report(id)
+        if not xml:
+            return json.dumps(report).encode()
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8" ?>\n<feedback><report_metadata>'
+            f"<org_name>{report['organization_name']}</org_name>"
+            f"<report_id>{report['external_id']}</report_id></report_metadata>"
+            f"<policy_published><domain>{self.config.domain}</domain>"
+            "</policy_published>"
+        ]
+        for record in report["records"]:
+            parts.append(
+                f"<record><row><source_ip>{record['source_ip']}</source_ip>"
+                f"<count>{record['count']}</count><policy_evaluated>"
+                f"<disposition>{record['policy_evaluated_disposition']}</disposition>"
+                f"<dkim>{record['policy_evaluated_dkim']}</dkim>"
+                f"<spf>{record['policy_evaluated_spf']}</spf></policy_evaluated></row>"
+                f"<identifiers><header_from>{record['header_from']}</header_from>"
+                f"</identifiers><auth_results><dkim><domain>{record['dkim_domain']}"
+                f"</domain><result>{record['dkim_result']}</result></dkim><spf>"
+                f"<domain>{record['spf_domain']}</domain><result>"
+                f"{record['spf_result']}</result></spf></auth_results></record>"
+            )
+        parts.append("</feedback>\n")
+        return "".join(parts).encode()
+
+    def list_reports(self, query: Dict[str, str]) -> Dict[str, Any]:
+        """Return a page of the report listing, filtered like the real API."""
+        first = max(self.first_id(query.get("from_date")), 1)
+        last = self.config.reports
+        if query.get("to_date"):
+            last = min(last, self.first_id(query["to_date"]) - 1)
+        total = max(last - first + 1, 0)
+        if query.get("after"):
+            first = max(first, int(query["after"]) + 1)
+        if query.get("before"):
+            last = min(last, int(query["before"]) - 1)
+        limit = min(int(query.get("limit") or 30), MAX_PAGE_SIZE)
+
+        if query.get("reverse") in ("true", "True", "1"):
+            ids = list(range(last, max(last - limit, first - 1), -1))
+            more = bool(ids) and ids[-1] > first
+        else:
+            ids = list(range(first, min(first + limit, last + 1)))
+            more = bool(ids) and ids[-1] < last
+        next_id = ids[-1] if more else None
+        return {
+            "meta": {
+                "next": next_id,
+                "next_url": (
+                    None
+                    if next_id is None
+                    else f"/records/my/reports?after={next_id}&limit={limit}"
+                ),
+                "total": total,
+            },
+            "entries": [self.entry(id) for id in ids],
+        }
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Answer requests from the MockDmarcApi of the server."""
+
+    # Keep connections alive, as the real API does
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let Nagle delay the body
+    disable_nagle_algorithm = True
+    server: "MockDmarcServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Don't log every request."""
+        pass
+
+    def do_GET(self) -> None:
+        """Serve the record, its DNS snippet, the report listing and the reports."""
+        self.handle_request("get")
+
+    def do_POST(self) -> None:
+        """Serve the DNS verification and token endpoints."""
+        self.handle_request("post")
+
+    def do_PATCH(self) -> None:
+        """Serve record updates."""
+        self.handle_request("patch")
+
+    def do_DELETE(self) -> None:
+        """Serve record deletion."""
+        self.handle_request("delete")
+
+    def handle_request(self, method: str) -> None:
+        """Route a request, after the configured latency and error injection."""
+        api = self.server.api
+        config = api.config
+        url = urlsplit(self.path)
+        self.server.count(method, url.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if config.latency:
+            time.sleep(config.latency)
+
+        if config.error_rate and api.random.random() < config.error_rate:
+            headers = {"Retry-After": "0"} if config.error_status == 429 else {}
+            return self.send_json(config.error_status, {"message": "Injected"}, headers)
+        public = (method, url.path) in (
+            ("post", "/records"),
+            ("post", "/tokens/recover"),
+        )
+        if not public and self.headers.get("X-Api-Token") != config.api_key:
+            return self.send_json(401, {"message": "Invalid API token"})
+
+        route = (method, url.path.rstrip("/"))
+        if route == ("get", "/records/my"):
+            return self.send_cacheable(api.record)
+        if route == ("get", "/records/my/dns"):
+            return self.send_cacheable(api.dns_snippet)
+        if route == ("post", "/records/my/verify"):
+            return self.send_json(200, {"domain": config.domain, "dns_verified": True})
+        if route == ("get", "/records/my/reports"):
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return self.send_json(200, api.list_reports(query))
+        if method == "get" and url.path.startswith("/records/my/reports/"):
+            id = url.path.rsplit("/", 1)[1]
+            if not id.isdigit() or not 1 <= int(id) <= config.reports:
+                return self.send_json(404, {"message": "Report not found"})
+            xml = "application/xml" in (self.headers.get("Accept") or "")
+            body = api.render_report(int(id), xml)
+            content_type = "application/xml" if xml else "application/json"
+            return self.send_body(200, body, {"Content-Type": content_type})
+        return self.send_json(404, {"message": "Not found"})
+
+    def send_cacheable(self, resource: Dict[str, Any]) -> None:
+        """Send a rarely changing resource, answering 304 if it wasn't modified."""
+        body = json.dumps(resource).encode()
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.send_body(304, b"", {"ETag": etag})
+        return self.send_body(
+            200, body, {"Content-Type": "application/json", "ETag": etag}
+        )
+
+    def send_json(
+        self, status: int, body: Any, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Send a JSON response."""
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        return self.send_body(status, json.dumps(body).encode(), headers)
+
+    def send_body(self, status: int, body: bytes, headers: Dict[str, str]) -> None:
+        """Send a response with a Content-Length, so the connection stays open."""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockDmarcServer(ThreadingHTTPServer):
+    """A mock Postmark DMARC API listening on a local port.
+
+    Use it as a context manager to serve from a background thread:
+
+        with MockDmarcServer(reports=500, latency=0.01) as server:
+            client = PostDmarc(api_key=API_KEY, endpoint=server.url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config: Any) -> None:
+        """Bind to `host` and `port`, any free port by default.
+
+        Keyword Arguments:
+        config  The fields of MockConfig.
+        """
+        super().__init__((host, port), MockRequestHandler)
+        self.api = MockDmarcApi(MockConfig(**config))
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The endpoint to pass to PostDmarc."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, method: str, path: str) -> None:
+        """Count a request, with report IDs folded into one path."""
+        if path.startswith("/records/my/reports/"):
+            path = "/records/my/reports/{id}"
+        with self.lock:
+            key = (method.upper(), path)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def __enter__(self) -> "MockDmarcServer":
+        """Start serving from a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def main(host: str = "127.0.0.1", port: int = 8025, **config: Any) -> None:
+    """Serve the mock API until interrupted.
+
+    Keyword Arguments:
+    host    The address to listen on. (default 127.0.0.1)
+    port    The port to listen on, or 0 for any free port. (default 8025)
+    config  The fields of MockConfig, such as reports, records_per_report, latency
+                and error_rate.
+    """
+    server = MockDmarcServer(host, port, **config)
+    print(f"Serving the mock DMARC API on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import fire
+
+    fire.Fire(main)
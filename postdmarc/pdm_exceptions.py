@@ -25,6 +25,12 @@ class UnprocessableEntityError(Exception):
     pass
 
 
+class TooManyRequestsError(Exception):
+    """Too many requests were sent in a given amount of time."""
+
+    pass
+
+
 class InternalServerError(Exception):
     """Our servers have failed to process your request."""
 
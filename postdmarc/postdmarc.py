@@ -2,17 +2,67 @@
 
 See the documentation at https://dmarc.postmarkapp.com/api/
 """
+import atexit
 import json
 import os
-from collections import defaultdict
+import queue
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import DefaultDict, NamedTuple, Optional, Type, Union
-
-import fire
-import requests
-from dateparser import parse
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Container,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from postdmarc import pdm_exceptions as errors
+from postdmarc.metrics import RequestEvent, RequestMetrics, endpoint_template
+from postdmarc.response_cache import ResponseCache
+from postdmarc.retry import RetryPolicy, TokenBucket
+
+if TYPE_CHECKING:
+    import requests
+
+    from postdmarc.dns_check import DnsCheck, Resolver
+    from postdmarc.shards import Window
+
+T = TypeVar("T")
+
+
+def __getattr__(name: str) -> Any:
+    """Import requests on first use, rather than when this module is imported.
+
+    Commands that work offline, such as query, never need it. Within this module,
+    requests is imported where it is used.
+    """
+    if name == "requests":
+        import requests
+
+        return requests
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Dates like 2020-01-31 or 2020/01/31, optionally followed by an ISO 8601 time
+ISO_DATE = re.compile(
+    r"(\d{4})([-/])(\d{1,2})\2(\d{1,2})"
+    r"(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?"
+)
 
 
 def format_date(date: Union[str, datetime, None]) -> Union[str, None]:
@@ -21,33 +71,376 @@ def format_date(date: Union[str, datetime, None]) -> Union[str, None]:
         return None
 
     if type(date) is str:
-        date_parsed = parse(date, settings={"STRICT_PARSING": True})
-        if date_parsed is None:
-            raise ValueError(f"Could not parse the date: {date}")
+        return format_date_string(date)
     elif type(date) is datetime:
         date_parsed = date
     return date_parsed.strftime(r"%Y-%m-%d")
 
 
+def format_date_string(date: str) -> str:
+    """Convert a date string to the format required by PostMark.
+
+    ISO 8601 style dates are converted directly and memoized. Anything else, such as
+    "yesterday" or "5 January 2020", is left to dateparser, which is slow to import
+    and to parse. Those results aren't memoized, since relative dates change over time.
+    """
+    date_formatted = format_iso_date(date)
+    if date_formatted is None:
+        date_formatted = parse_natural_date(date)
+    return date_formatted
+
+
+@lru_cache(maxsize=1024)
+def format_iso_date(date: str) -> Optional[str]:
+    """Convert an ISO 8601 style date string, or return None if it is not one."""
+    match = ISO_DATE.fullmatch(date.strip())
+    if match is None:
+        return None
+    year, _, month, day = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day)).strftime(r"%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Could not parse the date: {date}")
+
+
+def parse_natural_date(date: str) -> str:
+    """Convert a natural language date string with dateparser."""
+    from dateparser import parse
+
+    date_parsed = parse(date, settings={"STRICT_PARSING": True})
+    if date_parsed is None:
+        raise ValueError(f"Could not parse the date: {date}")
+    return date_parsed.strftime(r"%Y-%m-%d")
+
+
+def prefetch(iterable: Iterable[T], size: int) -> Iterator[T]:
+    """Iterate over `iterable` in a background thread, buffering up to `size` items.
+
+    Lets the next items be produced while the current ones are being consumed.
+    Exceptions raised by the iterable are re-raised in the consuming thread.
+    A size below 1 disables prefetching.
+    """
+    if size < 1:
+        yield from iterable
+        return
+
+    buffer: queue.Queue = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(done: bool, item: Any, error: Optional[Exception]) -> bool:
+        # Give up once the consumer has stopped, rather than blocking on a full buffer
+        while not stop.is_set():
+            try:
+                buffer.put((done, item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(False, item, None):
+                    return
+        except Exception as error:
+            put(True, None, error)
+        else:
+            put(True, None, None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            done, item, error = buffer.get()
+            if error is not None:
+                raise error
+            if done:
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+API_ENDPOINT = "https://dmarc.postmarkapp.com"
+# Seconds to wait for the API to accept a connection or send more of a response
+DEFAULT_TIMEOUT = 10.0
+# Formats of the request metrics report, see PostDmarc.request_metrics
+METRICS_FORMATS = ("summary", "prometheus")
+
+
+def response_size(response: "requests.Response", stream: bool) -> int:
+    """Return the number of bytes received in a response, as far as is known.
+
+    Streamed bodies are not read here, so only their Content-Length is counted.
+    """
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length)
+    if not stream:
+        return len(response.content)
+    return 0
+
+
+# Per request headers asking for the raw XML document of a report
+XML_HEADERS = {"Accept": "application/xml"}
+# Per request headers of public endpoints. Requests drops session headers set to None,
+# so the API key isn't sent, without touching the session shared by other threads.
+PUBLIC_HEADERS = {"X-Api-Token": None}
+
+
 class ResponseTuple(NamedTuple):
-    """Container for bundling response status code and json content."""
+    """Container for bundling response status code and json content.
+
+    Raw XML reports are held as a string in place of the json content.
+    """
 
     status_code: int
-    json: dict
+    json: Any
 
 
 class PostDmarc:
     """Connection object to the Postmark DMARC API."""
 
-    def __init__(self) -> None:
-        """Initialize object with default values."""
-        self.api_key = self.get_api_key()
-        self.endpoint = "https://dmarc.postmarkapp.com"
-        self.session = requests.Session()
-        self.session.headers.update(
-            {"X-Api-Token": self.api_key, "Accept": "application/json"}
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        cache_max_bytes: int = 2**30,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+        rate_limit: Optional[float] = None,
+        response_ttl: float = 0.0,
+        metrics: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        endpoint: str = API_ENDPOINT,
+        pool_size: Optional[int] = None,
+        json_backend: str = "auto",
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Initialize object with default values.
+
+        Keyword Arguments:
+        api_key         The API key of the record. Loaded from the POSTMARK_API_KEY
+                            environment variable or the PM_API.key file by default.
+        cache_path      Keep downloaded reports in a cache database at this path, so
+                            that each report is only downloaded once. (default None)
+        cache_max_bytes Evict the least recently used reports once the cache grows
+                            beyond this size. (default 1 GiB)
+        max_attempts    Number of times to try a request before giving up on
+                            rate limiting, server errors and connection errors.
+                            (default 3)
+        backoff         Seconds to wait before the first retry, doubling with each
+                            further attempt. (default 0.5)
+        rate_limit      Maximum average number of requests per second, shared by all
+                            threads. (default unlimited)
+        response_ttl    Seconds to reuse the record and its DNS snippet without asking
+                            the API. Afterwards they are revalidated with conditional
+                            requests, which don't resend unchanged bodies. (default 0)
+        metrics         Report the request metrics when the program exits, either as
+                            a "summary" or in "prometheus" text format. (default None)
+        metrics_path    Write the metrics report to this file instead of stderr.
+        endpoint        Base URL of the API, such as that of a local mock server.
+                            (default https://dmarc.postmarkapp.com)
+        pool_size       Connections to keep open, which should be at least the number
+                            of threads sharing the client. (default 10)
+        json_backend    Library decoding responses and writing JSON exports, either
+                            "orjson", "json" for the standard library, or "auto" to
+                            use orjson if it is installed. (default "auto")
+        timeout         Seconds to wait for the API to accept a connection or send
+                            more of a response before the attempt fails, to be
+                            retried like a connection error. (default 10)
+        """
+        self.api_key = api_key if api_key is not None else self.get_api_key()
+        self.endpoint = endpoint.rstrip("/")
+        self.timeout = timeout
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+        self._pool_size = pool_size or 0
+        self._cache = None
+        if cache_path is not None:
+            from postdmarc.cache import ReportCache
+
+            self._cache = ReportCache(cache_path, max_bytes=cache_max_bytes)
+            # Hits only record their access time in memory, which is saved at exit
+            # unless a report stored in the meantime has saved it already
+            atexit.register(self._cache.flush)
+        self.retry_policy = RetryPolicy(max_attempts=max_attempts, backoff=backoff)
+        self._rate_limiter = None
+        if rate_limit is not None:
+            self._rate_limiter = TokenBucket(rate_limit)
+        self._responses = ResponseCache(ttl=response_ttl)
+        from postdmarc.json_backend import get_backend
+
+        self._json = get_backend(json_backend)
+        self._hooks: Dict[str, List[Callable]] = {"request": [], "response": []}
+        self._metrics = RequestMetrics()
+        self.add_hook("response", self._metrics)
+        if metrics is not None:
+            if metrics not in METRICS_FORMATS:
+                raise ValueError(
+                    f"Metrics must be one of {list(METRICS_FORMATS)}, not {metrics}."
+                )
+            atexit.register(self._report_metrics, metrics, metrics_path)
+
+    @property
+    def session(self) -> "requests.Session":
+        """The HTTP session, created by the first request that needs it.
+
+        The session is shared by every thread using the client, so its headers are
+        never changed once it exists. Requests that need other headers pass them per
+        request instead.
+        """
+        with self._session_lock:
+            if self._session is None:
+                import requests
+
+                session = requests.Session()
+                session.headers.update(
+                    {"X-Api-Token": self.api_key, "Accept": "application/json"}
+                )
+                self._pool_size = max(
+                    self._pool_size, requests.adapters.DEFAULT_POOLSIZE
+                )
+                session.mount(
+                    self.endpoint,
+                    requests.adapters.HTTPAdapter(pool_maxsize=self._pool_size),
+                )
+                self._session = session
+        return self._session
+
+    def _size_connection_pool(self, size: int) -> None:
+        """Grow the connection pool so that it can hold `size` open connections."""
+        import requests
+
+        session = self.session
+        with self._session_lock:
+            if size <= self._pool_size:
+                return None
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=size)
+            session.mount(self.endpoint, adapter)
+            self._pool_size = size
+
+    def _request(
+        self, method: str, endpoint_path: str, **kwargs: Any
+    ) -> "requests.Response":
+        """Send a request, retrying transient failures according to the retry policy.
+
+        Every attempt waits for the rate limiter first, if one is configured, and
+        fails once the API stops responding for longer than the timeout.
+        """
+        import requests
+
+        send = getattr(self.session, method)
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = endpoint_template(endpoint_path)
+        attempt = 1
+        while True:
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            for hook in self._hooks["request"]:
+                hook(method, endpoint, attempt)
+            start = time.perf_counter()
+            try:
+                response = send(self.endpoint + endpoint_path, **kwargs)
+            except Exception as error:
+                self._notify_response(
+                    RequestEvent(
+                        method,
+                        endpoint,
+                        attempt,
+                        None,
+                        time.perf_counter() - start,
+                        0,
+                        error,
+                    )
+                )
+                if not isinstance(error, (requests.ConnectionError, requests.Timeout)):
+                    raise
+                if attempt >= self.retry_policy.max_attempts:
+                    raise
+                if not self.retry_policy.should_retry(method):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                self._notify_response(
+                    RequestEvent(
+                        method,
+                        endpoint,
+                        attempt,
+                        response.status_code,
+                        time.perf_counter() - start,
+                        response_size(response, kwargs.get("stream", False)),
+                    )
+                )
+                if attempt >= self.retry_policy.max_attempts:
+                    return response
+                if not self.retry_policy.should_retry(method, response.status_code):
+                    return response
+                delay = self.retry_policy.delay(
+                    attempt, response.headers.get("Retry-After")
+                )
+                if delay > self.retry_policy.max_retry_after:
+                    # Fail now rather than stall for as long as the server asks
+                    return response
+                # Release the connection, which a streamed response still holds
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _notify_response(self, event: RequestEvent) -> None:
+        """Pass the outcome of a request attempt to every response hook."""
+        for hook in self._hooks["response"]:
+            hook(event)
+
+    def add_hook(self, event: str, callback: Callable) -> None:
+        """Call `callback` around every request attempt, including retries.
+
+        Arguments:
+        event       Either "request", to call `callback(method, endpoint, attempt)`
+                        before each attempt is sent, or "response", to call
+                        `callback(request_event)` with the RequestEvent describing
+                        its outcome. Endpoints have IDs replaced by "{id}".
+        callback    The function to call. It runs on the thread sending the request,
+                        so it should be quick and thread-safe.
+        """
+        if event not in self._hooks:
+            raise ValueError(
+                f"Hook event must be one of {list(self._hooks)}, not {event}."
+            )
+        self._hooks[event].append(callback)
+
+    def request_metrics(self, fmt: str = "summary") -> Union[dict, str]:
+        """Return the metrics of the requests sent so far.
+
+        Keyword Arguments:
+        fmt     Either "summary", for the counts, retries, errors, bytes received and
+                    latency of each endpoint, or "prometheus", for the same metrics,
+                    with latency histograms, in Prometheus text format.
+                    (default "summary")
+        """
+        if fmt == "summary":
+            return self._metrics.summary()
+        elif fmt == "prometheus":
+            return self._metrics.prometheus()
+        raise ValueError(
+            f"Metrics format must be one of {list(METRICS_FORMATS)}, not {fmt}."
         )
 
+    def _report_metrics(self, fmt: str, path: Optional[str] = None) -> None:
+        """Write the request metrics to a file, or to stderr."""
+        metrics = self.request_metrics(fmt)
+        text = (
+            metrics
+            if isinstance(metrics, str)
+            else json.dumps(metrics, indent=2) + "\n"
+        )
+        if path is None:
+            sys.stderr.write(text)
+        else:
+            with open(path, "w") as f:
+                f.write(text)
+
     def get_api_key(self) -> str:
         """Set the API key and create the session."""
         # Try to load the API key from the environment variable
@@ -69,7 +462,17 @@ class PostDmarc:
                 )
         return PM_API_KEY
 
-    def check_response(self, response: requests.Response) -> None:
+    def _decode(self, response: "requests.Response") -> Any:
+        """Decode the JSON body of a response with the configured JSON backend.
+
+        Fast backends decode the body straight from bytes. The standard library goes
+        through requests, which first decodes the body to text.
+        """
+        if self._json.name == "json":
+            return response.json()
+        return self._json.loads(response.content)
+
+    def check_response(self, response: "requests.Response") -> None:
         """Check the status code of the API response.
 
         200 — OK
@@ -82,12 +485,14 @@ class PostDmarc:
             Something with your request isn’t quite right, this could be malformed JSON.
         422 — Unprocessable Entity
             Your request has failed validations.
+        429 — Too Many Requests
+            You have been rate limited, even after retrying.
         500 — Internal Server Error
             Our servers have failed to process your request.
 
         """
         mapping: DefaultDict[int, Optional[Type[Exception]]] = defaultdict(
-            Type[errors.UnrecognizedStatusCodeError]
+            lambda: errors.UnrecognizedStatusCodeError
         )
         mapping.update(
             [
@@ -98,6 +503,7 @@ class PostDmarc:
                 (401, errors.APIKeyInvalidError),
                 (404, errors.PageNotFoundError),
                 (422, errors.UnprocessableEntityError),
+                (429, errors.TooManyRequestsError),
                 (500, errors.InternalServerError),
             ]
         )
@@ -113,41 +519,79 @@ class PostDmarc:
         """Create a new DMARC record for a given domain and email."""
         endpoint_path = "/records"
         body = {"email": email, "domain": domain}
-        del self.session.headers["X-Api-Token"]
-        response = self.session.post(self.endpoint + endpoint_path, json=body)
-        self.session.headers.update({"X-Api-Token": self.api_key})
+        response = self._request(
+            "post", endpoint_path, json=body, headers=PUBLIC_HEADERS
+        )
+        self._responses.clear()
+        self.check_response(response)
+        return ResponseTuple(response.status_code, self._decode(response))
+
+    def _get_revalidated(self, endpoint_path: str) -> ResponseTuple:
+        """Get a rarely changing resource through the response cache.
+
+        Fresh cached responses are returned without a request. Stale ones are
+        revalidated with a conditional request, and reused if the API answers 304.
+        """
+        cached = self._responses.get(endpoint_path)
+        if cached is not None and self._responses.is_fresh(cached):
+            return ResponseTuple(cached.status_code, self._json.loads(cached.body))
+
+        headers = self._responses.validators(cached)
+        response = self._request("get", endpoint_path, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self._responses.renew(endpoint_path)
+            return ResponseTuple(cached.status_code, self._json.loads(cached.body))
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        self._responses.put(
+            endpoint_path, response.status_code, response.content, response.headers
+        )
+        return ResponseTuple(response.status_code, self._decode(response))
 
     def get_record(self) -> ResponseTuple:
         """Get a record’s information."""
         endpoint_path = "/records/my"
-        response = self.session.get(self.endpoint + endpoint_path)
-        self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return self._get_revalidated(endpoint_path)
 
     def update_record(self, email: str) -> ResponseTuple:
         """Update a record’s information."""
-        self.session.headers.update({"Content-Type": "application/json"})
         endpoint_path = "/records/patch"
         body = {"email": email}
-        response = self.session.patch(self.endpoint + endpoint_path, json=body)
+        response = self._request("patch", endpoint_path, json=body)
+        self._responses.clear()
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
 
     def get_dns_snippet(self) -> ResponseTuple:
         """Get generated DMARC DNS record name and value."""
         endpoint_path = "/records/my/dns"
-        response = self.session.get(self.endpoint + endpoint_path)
-        self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return self._get_revalidated(endpoint_path)
 
     def verify_dns(self) -> ResponseTuple:
         """Verify if your DMARC DNS record exists."""
         endpoint_path = "/records/my/verify"
-        response = self.session.post(self.endpoint + endpoint_path)
+        response = self._request("post", endpoint_path)
+        self._responses.clear()
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
+
+    def check_dns(self, resolver: Optional["Resolver"] = None) -> "DnsCheck":
+        """Compare the published DMARC DNS record to the generated one, locally.
+
+        The expected record comes from get_dns_snippet, but the lookup itself doesn't
+        involve the API, so it is much cheaper than verify_dns. Its status is "match",
+        "different" if the record reports to Postmark but other tags differ, such as
+        a stricter policy, "mismatch", "missing" or "unknown" if the lookup failed.
+
+        Keyword Arguments:
+        resolver    Function returning the TXT records of a DNS name. (default uses
+                        the optional dnspython dependency)
+        """
+        from postdmarc.dns_check import check_dmarc_record, default_resolver
+
+        if resolver is None:
+            resolver = default_resolver()
+        snippet = self.get_dns_snippet().json
+        return check_dmarc_record(snippet["name"], snippet["value"], resolver)
 
     def delete_record(self) -> ResponseTuple:
         """Delete a record.
@@ -157,9 +601,10 @@ class PostDmarc:
         weekly digests for this domain only.
         """
         endpoint_path = "/records/my"
-        response = self.session.delete(self.endpoint + endpoint_path)
+        response = self._request("delete", endpoint_path)
+        self._responses.clear()
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
 
     def list_reports(
         self,
@@ -198,93 +643,664 @@ class PostDmarc:
 
         params = {key: value for key, value in params.items() if value is not None}
 
-        response = self.session.get(self.endpoint + endpoint_path, params=params)
+        response = self._request("get", endpoint_path, params=params)
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
 
-    def get_report(self, id: int, fmt: str = "json") -> ResponseTuple:
+    def get_report(
+        self, id: int, fmt: str = "json", model: bool = False
+    ) -> ResponseTuple:
         """Load full DMARC report details.
 
         Load full DMARC report details as a raw DMARC XML document
-        or as our own JSON representation.
+        or as our own JSON representation. JSON reports are served from the report
+        cache when one is configured. XML documents are returned as a string; use
+        download_report or iter_report_records for large reports.
+
+        Set `model` to get JSON reports as a compact postdmarc.report_model.Report
+        instead of nested dictionaries, which saves memory when holding many reports.
         """
-        if fmt == "json":
-            self.session.headers.update({"Content-Type": "application/json"})
-        elif fmt == "xml":
-            self.session.headers.update({"Content-Type": "application/xml"})
-        else:
+        if model:
+            from postdmarc.report_model import Report
+
+            if fmt != "json":
+                raise errors.BadRequestError("Only JSON reports can be modelled.")
+            report = self.get_report(id)
+            return ResponseTuple(report.status_code, Report(report.json))
+
+        if fmt == "xml":
+            endpoint_path = f"/records/my/reports/{id}"
+            response = self._request("get", endpoint_path, headers=XML_HEADERS)
+            self.check_response(response)
+            return ResponseTuple(response.status_code, response.text)
+        elif fmt != "json":
             raise errors.BadRequestError(
                 f"Format keyword must be either 'json' or 'xml', not {fmt}."
             )
 
+        if self._cache is not None:
+            cached = self._cache.get(id)
+            if cached is not None:
+                return ResponseTuple(200, cached)
+
         endpoint_path = f"/records/my/reports/{id}"
-        response = self.session.get(self.endpoint + endpoint_path)
+        response = self._request("get", endpoint_path)
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        report = ResponseTuple(response.status_code, self._decode(response))
+        if self._cache is not None and report.status_code == 200:
+            self._cache.put(id, report.json)
+        return report
+
+    def _stream_report_xml(self, id: int) -> "requests.Response":
+        """Request the raw XML document of a report, without reading the body."""
+        endpoint_path = f"/records/my/reports/{id}"
+        response = self._request("get", endpoint_path, headers=XML_HEADERS, stream=True)
+        try:
+            self.check_response(response)
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def download_report(self, id: int, filepath: str, chunk_size: int = 2**16) -> int:
+        """Stream the raw DMARC XML document of a report to a file.
+
+        The document is written in chunks, so reports of any size are downloaded in
+        bounded memory. The file only appears once the download has completed.
+        Returns the number of bytes written.
+
+        Arguments:
+        id          The ID of the report.
+        filepath    The file to save the XML document to.
+
+        Keyword Arguments:
+        chunk_size  Number of bytes to read from the response at a time.
+                        (default 64 KiB)
+        """
+        response = self._stream_report_xml(id)
+        tmp_path = f"{filepath}.part"
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, filepath)
+        finally:
+            response.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size
+
+    def iter_report_records(self, id: int) -> Iterator[dict]:
+        """Yield the records of a report while its raw XML document downloads.
+
+        The XML is parsed incrementally as it arrives, so even the largest aggregate
+        reports are processed in bounded memory. Records have the same keys as the
+        records of JSON reports; see postdmarc.xml_report.iter_xml_records.
+        """
+        from postdmarc.xml_report import iter_xml_records
+
+        response = self._stream_report_xml(id)
+        try:
+            # Let urllib3 undo any gzip content encoding while parsing
+            response.raw.decode_content = True
+            yield from iter_xml_records(response.raw)
+        finally:
+            response.close()
+
+    def cache_stats(self) -> dict:
+        """Report hits and misses of the report cache, and its current size."""
+        if self._cache is None:
+            raise ValueError("No report cache is configured. Set the cache_path.")
+        return self._cache.stats()
+
+    def iter_reports(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yield report listing entries, following the pagination cursor.
+
+        Pages are only requested as the entries are consumed, and only one page is
+        held at a time, so stopping early skips the remaining requests.
+
+        Keyword Arguments:
+        from_date   Only include reports received on this date or after.
+        to_date     Only include reports received before this date.
+        limit       Number of reports to request per page. (default 30, max 50)
+        after       Only include reports with IDs higher than the specified value.
+        """
+        for entries, _ in self._iter_pages(
+            from_date=from_date, to_date=to_date, limit=limit, after=after
+        ):
+            yield from entries
+
+    def iter_report_details(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+        concurrency: int = 1,
+        prefetch_pages: int = 1,
+        shard_days: int = 0,
+        model: bool = False,
+    ) -> Iterator[ResponseTuple]:
+        """Yield the full details of every listed report, in order of report ID.
+
+        See iter_reports for a description of the other keyword arguments.
+
+        Keyword Arguments:
+        concurrency     Number of reports to download in parallel. (default 1)
+        prefetch_pages  Number of listing pages to request ahead while reports are
+                            downloading. Set to 0 to disable. (default 1)
+        shard_days      Split the date range into windows of this many days, which
+                            are listed in parallel. Requires both dates, and can't be
+                            combined with after. (default 0, not split)
+        model           Yield each report as a compact Report model instead of nested
+                            dictionaries, see get_report. (default false)
+        """
+        if shard_days:
+            if after is not None:
+                raise ValueError("Sharded listings can't start after a report ID.")
+            pages = self._iter_sharded_pages(
+                from_date, to_date, shard_days, concurrency, limit=limit
+            )
+        else:
+            pages = self._iter_pages(
+                from_date=from_date, to_date=to_date, limit=limit, after=after
+            )
+        for _, reports, _ in self._iter_detail_pages(
+            pages, concurrency, prefetch_pages=prefetch_pages
+        ):
+            if model:
+                from postdmarc.report_model import Report
+
+                reports = [
+                    ResponseTuple(report.status_code, Report(report.json))
+                    for report in reports
+                ]
+            yield from reports
+
+    def _iter_pages(
+        self, after: Optional[int] = None, **params
+    ) -> Iterator[Tuple[List[dict], Optional[int]]]:
+        """Yield the entries of each listing page with the cursor of the next page."""
+        while True:
+            current_reports = self.list_reports(after=after, **params)
+            after = current_reports.json["meta"]["next"]
+            yield current_reports.json["entries"], after
+            if after is None:
+                return
+
+    def _list_window(
+        self, window: "Window", limit: Optional[int]
+    ) -> Optional[List[List[dict]]]:
+        """List the entries of a date window, page by page.
+
+        Returns None after the first page if the window holds more than one page and
+        spans more than one day, so that it can be split instead.
+        """
+        from postdmarc.shards import bisect_window
+
+        from_date, to_date = (day.isoformat() for day in window)
+        pages: List[List[dict]] = []
+        after = None
+        while True:
+            response = self.list_reports(from_date, to_date, limit=limit, after=after)
+            after = response.json["meta"]["next"]
+            if after is not None and not pages and len(bisect_window(window)) > 1:
+                return None
+            pages.append(response.json["entries"])
+            if after is None:
+                return pages
+
+    def _iter_sharded_pages(
+        self,
+        from_date: Union[str, datetime, None],
+        to_date: Union[str, datetime, None],
+        shard_days: int,
+        concurrency: int,
+        limit: Optional[int] = None,
+    ) -> Iterator[Tuple[List[dict], Optional[int]]]:
+        """Yield the listing pages of a date range, listing its windows in parallel.
+
+        The range is split into windows of `shard_days` days, which are listed by
+        `concurrency` threads and yielded in date order. Windows holding more than one
+        page are halved until they hold a single page or a single day, so busy days
+        get windows of their own while quiet weeks share one. Reports that were
+        already yielded for an earlier window are left out. There is no cursor that
+        covers every window, so the cursor yielded with each page is None.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+        if from_date is None or to_date is None:
+            raise ValueError("Sharded listings need both a from_date and a to_date.")
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        from postdmarc.shards import bisect_window, split_date_range
+
+        windows = deque(
+            split_date_range(format_date(from_date), format_date(to_date), shard_days)
+        )
+        seen: set = set()
+        # Leave room in the pool for the report downloads running alongside
+        self._size_connection_pool(2 * concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+            def submit(window: "Window") -> Tuple["Window", Any]:
+                return window, executor.submit(self._list_window, window, limit)
+
+            running: deque = deque()
+            while windows or running:
+                while windows and len(running) < concurrency:
+                    running.append(submit(windows.popleft()))
+                window, future = running.popleft()
+                pages = future.result()
+                if pages is None:
+                    halves = [submit(half) for half in bisect_window(window)]
+                    running.extendleft(reversed(halves))
+                    continue
+                for entries in pages:
+                    entries = [entry for entry in entries if entry["id"] not in seen]
+                    seen.update(entry["id"] for entry in entries)
+                    if entries:
+                        yield entries, None
+
+    def _iter_detail_pages(
+        self,
+        pages: Iterable[Tuple[List[dict], Optional[int]]],
+        concurrency: int,
+        skip: Container[int] = (),
+        prefetch_pages: int = 1,
+    ) -> Iterator[Tuple[List[int], List[ResponseTuple], Optional[int]]]:
+        """Download the full reports of each listing page, skipping the IDs in `skip`.
+
+        Up to `prefetch_pages` listing pages are requested in the background while the
+        reports of the current page download, so the two stages overlap.
+        Yields the downloaded IDs, their reports and the cursor of the next page.
+        """
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._size_connection_pool(concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for entries, after in prefetch(pages, prefetch_pages):
+                ids = [entry["id"] for entry in entries if entry["id"] not in skip]
+                # executor.map yields in submission order, so reports stay sorted by ID
+                yield ids, list(executor.map(self.get_report, ids)), after
 
     def export_all_reports(
         self,
         from_date: Union[str, datetime],
         to_date: Union[str, datetime],
         filepath: str,
+        concurrency: int = 1,
+        output_format: str = "json",
+        resume: bool = False,
+        prefetch_pages: int = 1,
+        store_path: Optional[str] = None,
+        shard_days: int = 0,
     ) -> None:
         """Query for all forensic reports in a date range and export to a json file.
 
+        Reports are written to the file as they are downloaded, one page of the report
+        listing at a time, so memory use does not grow with the size of the date range.
+        Progress is saved to a checkpoint file next to the exported file after every
+        page and removed once the export is complete.
+
         Arguments:
         from_date   Only include reports received on this date or after.
         to_date     Only include reports received before this date.
-        filepath    The file name to export to. Should end in ".json".
+        filepath    The file name to export to. Should end in the output format.
+
+        Keyword Arguments:
+        concurrency     Number of reports to download in parallel. (default 1)
+        output_format   One of (default "json"):
+                            "json"  A single JSON array of reports.
+                            "jsonl" One report per line in the JSON Lines format.
+                            "csv"   One row per report record, flattened.
+                            "npz"   Compressed NumPy arrays, one per CSV column.
+        resume          Continue an interrupted export from its checkpoint, skipping
+                            reports that were already written. (default false)
+        prefetch_pages  Number of listing pages to request ahead while reports are
+                            downloading. Set to 0 to disable. (default 1)
+        store_path      Also add the exported reports to the local report store at
+                            this path, to be searched with query. (default None)
+        shard_days      Split the date range into windows of this many days, which
+                            are listed in parallel by `concurrency` threads. Windows
+                            holding more than one page are split further, down to
+                            single days. Reports are written in date order, without
+                            duplicates. (default 0, not split)
         """
-        reports = []
-        output = []
+        from postdmarc import writers
+        from postdmarc.checkpoint import ExportCheckpoint
+        from postdmarc.store import ReportStore
 
-        params = {
-            "from_date": from_date,
-            "to_date": to_date,
-            "after": None,
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+        if output_format not in writers.EXPORT_FORMATS:
+            raise ValueError(
+                f"Output format must be one of {sorted(writers.EXPORT_FORMATS)}, "
+                f"not {output_format}."
+            )
+
+        query = {
+            "from_date": format_date(from_date),
+            "to_date": format_date(to_date),
+            "output_format": output_format,
         }
-        # Get first batch of reports
-        current_reports = self.list_reports(**params)
-        params["after"] = current_reports.json["meta"]["next"]
-        reports.extend(current_reports.json["entries"])
+        if shard_days:
+            # Sharded and unsharded exports keep different progress, so a checkpoint
+            # of one can't resume the other
+            query["shard_days"] = shard_days
+        checkpoint = ExportCheckpoint(filepath, track_ids=bool(shard_days), **query)
+        if resume:
+            if writers.EXPORT_FORMATS[output_format].binary:
+                raise ValueError(f"Exports to {output_format} cannot be resumed.")
+            checkpoint.load()
+
+        if shard_days:
+            # Resumed sharded exports list every window again, skipping the reports
+            # logged in the checkpoint
+            pages = self._iter_sharded_pages(
+                from_date, to_date, shard_days, concurrency
+            )
+        elif checkpoint.finished:
+            # Every report was written before the export was interrupted, only the
+            # file is left to finish
+            pages = iter(())
+        else:
+            pages = self._iter_pages(
+                from_date=from_date, to_date=to_date, after=checkpoint.after
+            )
+        store = ReportStore(store_path) if store_path is not None else None
+        try:
+            append = checkpoint.count > 0
+            with writers.open_export(filepath, output_format, append) as f:
+                if append:
+                    # Discard anything written after the checkpoint was saved
+                    f.seek(checkpoint.offset)
+                    f.truncate()
+                writer_type = writers.EXPORT_FORMATS[output_format]
+                options = {}
+                if output_format in writers.JSON_FORMATS:
+                    options["dumps"] = self._json.dumps
+                writer = writer_type(f, count=checkpoint.count, **options)
+                for ids, reports, after in self._iter_detail_pages(
+                    pages,
+                    concurrency,
+                    skip=checkpoint.fetched,
+                    prefetch_pages=prefetch_pages,
+                ):
+                    for report in reports:
+                        writer.write(report)
+                    f.flush()
+                    if store is not None:
+                        store.add(report.json for report in reports)
+                    checkpoint.update(after, ids, f.tell(), writer.count)
+                writer.close()
+            checkpoint.remove()
+        finally:
+            if store is not None:
+                store.close()
+
+    def sync(
+        self,
+        store_path: str,
+        from_date: Union[str, datetime, None] = None,
+        concurrency: int = 1,
+    ) -> dict:
+        """Download the reports received since the last sync into a local store.
+
+        The highest report ID already in the store is used as the "after" cursor of
+        the report listing, so each run only lists and downloads new reports.
+
+        Arguments:
+        store_path  The report store database to update. Created if it doesn't exist.
+
+        Keyword Arguments:
+        from_date   Only include reports received on this date or after.
+        concurrency Number of reports to download in parallel. (default 1)
+        """
+        from postdmarc.store import ReportStore
+
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
+
+        store = ReportStore(store_path)
+        new_reports = 0
+        pages = self._iter_pages(from_date=from_date, after=store.last_id())
+        try:
+            for ids, reports, _ in self._iter_detail_pages(pages, concurrency):
+                store.add(report.json for report in reports)
+                new_reports += len(ids)
+            return {"new_reports": new_reports, "last_id": store.last_id()}
+        finally:
+            store.close()
+
+    def watch(
+        self,
+        interval: float = 300.0,
+        jitter: float = 0.1,
+        filepath: Optional[str] = None,
+        store_path: Optional[str] = None,
+        after: Optional[int] = None,
+        concurrency: int = 1,
+        max_polls: Optional[int] = None,
+    ) -> Optional[dict]:
+        """Poll for new reports and hand each one to the sinks, until interrupted.
+
+        Every poll lists the reports after the highest ID seen so far, reusing the
+        same client and its open connections, so a poll that finds nothing new costs
+        a single request. New reports are appended to `filepath` and added to the
+        store at `store_path`, or written to stdout if neither is given, in the JSON
+        Lines format of export_all_reports. A failed poll is reported on stderr and
+        tried again at the next interval. Returns the number of polls, failed polls
+        and new reports, and the highest report ID seen. When the reports go to
+        stdout, these are written to stderr instead, so stdout holds only JSON Lines.
+
+        Keyword Arguments:
+        interval    Seconds between the start of one poll and the next. (default 300)
+        jitter      Vary each interval at random by up to this fraction, so that many
+                        watchers don't poll in step. (default 0.1)
+        filepath    Append new reports to this JSON Lines file.
+        store_path  Add new reports to the local report store at this path.
+        after       Only hand over reports with IDs higher than this. By default,
+                        the highest ID in the store, or else the newest report listed
+                        when watching starts.
+        concurrency Number of reports to download in parallel. (default 1)
+        max_polls   Stop after this many polls. (default unlimited)
+        """
+        import random
+
+        from postdmarc import writers
+        from postdmarc.store import ReportStore
+
+        if interval <= 0:
+            raise ValueError(f"Interval must be positive, not {interval}.")
+        if not 0 <= jitter < 1:
+            raise ValueError(f"Jitter must be at least 0 and below 1, not {jitter}.")
+        if concurrency < 1:
+            raise ValueError(f"Concurrency must be at least 1, not {concurrency}.")
 
-        # Get any subsequent reports
-        while params["after"] is not None:
-            current_reports = self.list_reports(**params)
-            params["after"] = current_reports.json["meta"]["next"]
-            reports.extend(current_reports.json["entries"])
+        store = ReportStore(store_path) if store_path is not None else None
+        f = open(filepath, "a", encoding="utf-8") if filepath is not None else None
+        writer = None
+        if f is not None:
+            writer = writers.JsonLinesWriter(f, dumps=self._json.dumps)
+        elif store is None:
+            # The encoding of stdout depends on the locale, so keep the output ASCII
+            writer = writers.JsonLinesWriter(sys.stdout, dumps=json.dumps)
 
-        ids = [entry["id"] for entry in reports]
-        output.extend([self.get_report(ident) for ident in ids])
+        stats = {"polls": 0, "failed_polls": 0, "new_reports": 0, "last_id": after}
+        try:
+            if stats["last_id"] is None and store is not None:
+                stats["last_id"] = store.last_id()
+            if stats["last_id"] is None:
+                newest = self.list_reports(limit=1, reverse=True).json["entries"]
+                stats["last_id"] = newest[0]["id"] if newest else None
 
-        with open(filepath, "w") as f:
-            json.dump(output, f)
+            while max_polls is None or stats["polls"] < max_polls:
+                start = time.monotonic()
+                stats["polls"] += 1
+                try:
+                    pages = self._iter_pages(after=stats["last_id"])
+                    for ids, reports, _ in self._iter_detail_pages(pages, concurrency):
+                        if writer is not None:
+                            for report in reports:
+                                writer.write(report)
+                            writer.f.flush()
+                        if store is not None:
+                            store.add(report.json for report in reports)
+                        if ids:
+                            stats["last_id"] = max(ids)
+                            stats["new_reports"] += len(ids)
+                except Exception as error:
+                    stats["failed_polls"] += 1
+                    print(
+                        f"Poll {stats['polls']} failed: {type(error).__name__}: "
+                        f"{error}",
+                        file=sys.stderr,
+                    )
+                if max_polls is not None and stats["polls"] >= max_polls:
+                    break
+                delay = interval * (1 + jitter * random.uniform(-1, 1))
+                time.sleep(max(delay - (time.monotonic() - start), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if f is not None:
+                f.close()
+            if store is not None:
+                store.close()
+        if f is None and store is None:
+            print(json.dumps(stats), file=sys.stderr)
+            return None
+        return stats
+
+    def query(
+        self,
+        store_path: str,
+        source_ip: Optional[str] = None,
+        header_from: Optional[str] = None,
+        organization_name: Optional[str] = None,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        disposition: Optional[str] = None,
+        spf: Optional[str] = None,
+        dkim: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Search the records of a local report store, without any API requests.
+
+        Returns the flattened records, along with the ID, domain, reporting
+        organization and date range of their report, that match all given filters.
+        Reports are added to a store by sync or by export_all_reports.
+
+        Arguments:
+        store_path  The report store database to search.
+
+        Keyword Arguments:
+        source_ip           Only include records sent from this IP address.
+        header_from         Only include records with this header from domain.
+        organization_name   Only include reports by this reporting organization.
+        from_date           Only include reports whose date range begins on this
+                                date or after.
+        to_date             Only include reports whose date range begins before
+                                this date.
+        disposition         Only include records with this evaluated disposition,
+                                one of "none", "quarantine" or "reject".
+        spf                 Only include records with this aligned SPF result.
+        dkim                Only include records with this aligned DKIM result.
+        limit               Return at most this many records.
+        """
+        from postdmarc.store import ReportStore
+
+        store = ReportStore(store_path)
+        try:
+            return store.query(
+                source_ip=source_ip,
+                header_from=header_from,
+                organization_name=organization_name,
+                from_date=format_date(from_date),
+                to_date=format_date(to_date),
+                disposition=disposition,
+                spf=spf,
+                dkim=dkim,
+                limit=limit,
+            )
+        finally:
+            store.close()
+
+    def summarize(
+        self,
+        from_date: Union[str, datetime, None] = None,
+        to_date: Union[str, datetime, None] = None,
+        filepath: Optional[str] = None,
+        concurrency: int = 1,
+        top: Optional[int] = None,
+    ) -> dict:
+        """Aggregate message counts of DMARC reports in a single streaming pass.
+
+        Counts messages, SPF and DKIM alignment, DMARC passes and dispositions, in
+        total and grouped by source IP, reporting organization, header from domain,
+        disposition and day. Reports are either downloaded for a date range, or read
+        from a file written by export_all_reports in the json, jsonl or csv format.
+
+        Keyword Arguments:
+        from_date   Only include reports received on this date or after.
+        to_date     Only include reports received before this date.
+        filepath    Summarize this exported file instead of downloading reports.
+        concurrency Number of reports to download in parallel. (default 1)
+        top         Only include this many of each grouping, with the most messages.
+        """
+        from postdmarc.summary import ReportSummary, iter_exported_rows
+
+        summary = ReportSummary()
+        if filepath is not None:
+            for row in iter_exported_rows(filepath):
+                summary.add_row(row)
+        else:
+            for report in self.iter_report_details(
+                from_date, to_date, concurrency=concurrency
+            ):
+                summary.add_report(report.json)
+        return summary.result(top)
 
     def recover_token(self, owner: str) -> ResponseTuple:
         """Initiate API token recovery for a domain.
 
         This endpoint is public and doesn't require authentication.
         """
-        self.session.headers.update({"Content-Type": "application/json"})
         endpoint_path = "/tokens/recover"
         body = {"owner": owner}
-        del self.session.headers["X-Api-Token"]
-        response = self.session.post(self.endpoint + endpoint_path, json=body)
-        self.session.headers.update({"X-Api-Token": self.api_key})
+        response = self._request(
+            "post", endpoint_path, json=body, headers=PUBLIC_HEADERS
+        )
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
 
     def rotate_token(self) -> ResponseTuple:
         """Generate a new API token and replace your existing one with it."""
         # TODO: Think about how to implement key rotation within this wrapper
         endpoint_path = "/records/my/token/rotate"
-        response = self.session.post(self.endpoint + endpoint_path)
+        response = self._request("post", endpoint_path)
+        self._responses.clear()
         self.check_response(response)
-        return ResponseTuple(response.status_code, response.json())
+        return ResponseTuple(response.status_code, self._decode(response))
 
 
 def main() -> None:
     """Run default behavior: retrieve forensic reports from the past 7 days."""
+    import fire
+
     fire.Fire(PostDmarc)
 
 
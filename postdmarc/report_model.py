@@ -0,0 +1,139 @@
+"""Compact typed model of full DMARC reports.
+
+Reports decoded from JSON are nested dictionaries, which cost several hundred bytes
+of overhead each. Report and ReportRecord store their fields in slots instead and
+share repeated strings, and a report only decodes its records once they are first
+accessed.
+"""
+
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from postdmarc.writers import RECORD_COLUMNS
+
+# Fields of a full report besides its records, in the order of the API documentation
+REPORT_FIELDS = (
+    "id",
+    "domain",
+    "date_range_begin",
+    "date_range_end",
+    "external_id",
+    "organization_name",
+    "email",
+    "created_at",
+)
+
+
+class ReportRecord:
+    """One record of a report: the results for mail from one source IP address."""
+
+    __slots__ = RECORD_COLUMNS
+
+    header_from: Optional[str]
+    source_ip: Optional[str]
+    source_ip_version: Optional[int]
+    host_name: Optional[str]
+    count: Optional[int]
+    policy_evaluated_spf: Optional[str]
+    policy_evaluated_dkim: Optional[str]
+    policy_evaluated_disposition: Optional[str]
+    policy_evaluated_reason_type: Optional[str]
+    spf_domain: Optional[str]
+    spf_result: Optional[str]
+    dkim_domain: Optional[str]
+    dkim_result: Optional[str]
+
+    def __init__(self, record: Dict[str, Any]) -> None:
+        """Copy the fields of a record decoded from JSON. Missing fields are None.
+
+        String values are interned, since results, dispositions and domains repeat
+        across the records of all reports.
+        """
+        for column in RECORD_COLUMNS:
+            value = record.get(column)
+            if type(value) is str:
+                value = sys.intern(value)
+            setattr(self, column, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the record as it was decoded from JSON."""
+        return {column: getattr(self, column) for column in RECORD_COLUMNS}
+
+    def __eq__(self, other: object) -> bool:
+        """Compare records field by field."""
+        if not isinstance(other, ReportRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        """Show the source and outcome of the record."""
+        return (
+            f"ReportRecord(source_ip={self.source_ip!r}, count={self.count!r}, "
+            f"disposition={self.policy_evaluated_disposition!r})"
+        )
+
+
+class Report:
+    """A full DMARC report, with its records decoded on first access.
+
+    Until `records` is first read, the report holds on to the record dictionaries it
+    was created from. Reading it turns them into ReportRecord objects and releases
+    the dictionaries. Fields the model doesn't know about are kept in `extra`.
+    """
+
+    __slots__ = REPORT_FIELDS + ("extra", "_records", "_raw_records")
+
+    id: int
+    domain: Optional[str]
+    date_range_begin: Optional[str]
+    date_range_end: Optional[str]
+    external_id: Optional[str]
+    organization_name: Optional[str]
+    email: Optional[str]
+    created_at: Optional[str]
+    extra: Optional[Dict[str, Any]]
+
+    def __init__(self, report: Dict[str, Any]) -> None:
+        """Wrap a full report decoded from JSON, such as the json of get_report."""
+        for field in REPORT_FIELDS:
+            setattr(self, field, report.get(field))
+        extra = {
+            key: value
+            for key, value in report.items()
+            if key not in REPORT_FIELDS and key != "records"
+        }
+        self.extra = extra or None
+        self._records: Optional[Tuple[ReportRecord, ...]] = None
+        self._raw_records: Optional[List[Dict[str, Any]]] = report.get("records") or []
+
+    @property
+    def records(self) -> Tuple[ReportRecord, ...]:
+        """The records of the report, decoded the first time they are accessed."""
+        if self._records is None:
+            self._records = tuple(ReportRecord(record) for record in self._raw_records)
+            self._raw_records = None
+        return self._records
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the report as it was decoded from JSON."""
+        report = {field: getattr(self, field) for field in REPORT_FIELDS}
+        if self.extra:
+            report.update(self.extra)
+        if self._records is None:
+            report["records"] = self._raw_records
+        else:
+            report["records"] = [record.to_dict() for record in self._records]
+        return report
+
+    def __eq__(self, other: object) -> bool:
+        """Compare reports field by field, including their records."""
+        if not isinstance(other, Report):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        """Show the ID and origin of the report."""
+        return (
+            f"Report(id={self.id!r}, organization_name={self.organization_name!r}, "
+            f"date_range_begin={self.date_range_begin!r})"
+        )
@@ -0,0 +1,97 @@
+"""In-memory cache of API responses that are revalidated with conditional requests."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    """A cached response body, with the validators the server sent along with it.
+
+    The body is kept as the bytes received, and decoded for every caller, so that no
+    caller can change what the others are given.
+    """
+
+    status_code: int
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored: float
+
+
+class ResponseCache:
+    """Responses of rarely changing endpoints, such as the record and its DNS snippet.
+
+    Entries are served without a request for `ttl` seconds. After that they are
+    revalidated: the request carries If-None-Match and If-Modified-Since headers, and a
+    304 Not Modified answer, which has no body, renews the entry. Only the `max_entries`
+    most recently stored entries are kept. Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 0.0,
+        max_entries: int = 32,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create an empty cache."""
+        if ttl < 0:
+            raise ValueError(f"Response TTL must not be negative, not {ttl}.")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the cached response for `key`, fresh or not, or None."""
+        with self.lock:
+            return self.entries.get(key)
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        """Decide if an entry can be served without revalidating it."""
+        return self.clock() - entry.stored < self.ttl
+
+    def validators(self, entry: Optional[CachedResponse]) -> Dict[str, str]:
+        """Return the conditional request headers that revalidate an entry."""
+        headers = {}
+        if entry is not None and entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, key: str, status_code: int, body: bytes, headers: Any) -> None:
+        """Store a response body, along with the validators in its `headers`.
+
+        Responses without an ETag or Last-Modified header are only kept while fresh,
+        since they cannot be revalidated.
+        """
+        entry = CachedResponse(
+            status_code,
+            body,
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+            self.clock(),
+        )
+        if not self.ttl and entry.etag is None and entry.last_modified is None:
+            return None
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def renew(self, key: str) -> Optional[CachedResponse]:
+        """Restart the freshness period of an entry the server reported unchanged."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry = self.entries[key] = entry._replace(stored=self.clock())
+        return entry
+
+    def clear(self) -> None:
+        """Forget every entry, after a request that may have changed them."""
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,103 @@
+"""Retry and rate limiting policies for requests to the Postmark DMARC API."""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, FrozenSet, NamedTuple, Optional
+
+
+class RetryPolicy(NamedTuple):
+    """How transient failures are retried.
+
+    Requests that were rate limited (429) are always retried. Server errors and
+    connection failures are only retried for idempotent `methods`, since the request
+    may already have been processed. Delays grow exponentially from `backoff` up to
+    `max_backoff` and are shortened by a random fraction of up to `jitter`, unless
+    the server sends a Retry-After header, which is honored instead. A Retry-After
+    longer than `max_retry_after` isn't waited for: the request fails instead.
+    """
+
+    max_attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    jitter: float = 0.5
+    max_retry_after: float = 60.0
+    statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    methods: FrozenSet[str] = frozenset({"get", "delete"})
+
+    def should_retry(self, method: str, status_code: Optional[int] = None) -> bool:
+        """Decide if a failed request can be retried.
+
+        A status code of None means that the request failed to connect.
+        """
+        if status_code == 429:
+            return True
+        if status_code is not None and status_code not in self.statuses:
+            return False
+        return method in self.methods
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Return the number of seconds to wait after the given failed attempt.
+
+        This may exceed `max_retry_after` only when the server asked for it.
+        """
+        if isinstance(retry_after, str):
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * (1 - self.jitter * random.random())
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Convert a Retry-After header, in seconds or as an HTTP date, to seconds."""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class TokenBucket:
+    """Client-side rate limiter allowing `rate` requests per second on average.
+
+    Up to `capacity` requests may be sent in a burst. Safe to share between threads;
+    waiting callers are served in the order they called `acquire`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a full bucket."""
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, not {rate}.")
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token from the bucket, waiting until one is available."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # Reserve the token now, so later callers queue up behind this one
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
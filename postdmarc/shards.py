@@ -0,0 +1,45 @@
+"""Split the date range of a report listing into windows that are listed in parallel.
+
+The listing is paginated with a cursor, so the pages of one date range can only be
+requested one after the other. Separate date windows have their own cursors, though,
+so their pages can be requested at the same time.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+# A date range of the listing, from its first day up to but excluding its last
+Window = Tuple[date, date]
+
+
+def parse_day(day: str) -> date:
+    """Convert a date in the format required by Postmark to a date."""
+    return datetime.strptime(day, "%Y-%m-%d").date()
+
+
+def split_date_range(from_date: str, to_date: str, days: int) -> List[Window]:
+    """Split a date range into consecutive windows of `days` days.
+
+    The last window is shorter if the range doesn't divide evenly. An empty range
+    gives no windows.
+    """
+    if days < 1:
+        raise ValueError(f"Shard days must be at least 1, not {days}.")
+
+    start, end = parse_day(from_date), parse_day(to_date)
+    step = timedelta(days=days)
+    windows = []
+    while start < end:
+        windows.append((start, min(start + step, end)))
+        start += step
+    return windows
+
+
+def bisect_window(window: Window) -> List[Window]:
+    """Split a window into two halves, or return it as is if it is a single day."""
+    start, end = window
+    days = (end - start).days
+    if days <= 1:
+        return [window]
+    middle = start + timedelta(days=days // 2)
+    return [(start, middle), (middle, end)]
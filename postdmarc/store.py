@@ -0,0 +1,163 @@
+"""Local SQLite store of synchronized DMARC reports."""
+
+import json
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from postdmarc.writers import COLUMNS, REPORT_COLUMNS, flatten_report
+
+# Report columns, besides the ID, kept alongside each report body for indexing
+INDEXED_REPORT_COLUMNS = REPORT_COLUMNS[1:]
+INDEXES = {
+    "reports_date": "reports (date_range_begin)",
+    "reports_organization": "reports (organization_name)",
+    "records_report": "records (report_id)",
+    "records_source_ip": "records (source_ip)",
+    "records_disposition": "records (policy_evaluated_disposition)",
+    "records_policy": "records (policy_evaluated_spf, policy_evaluated_dkim)",
+}
+# Filters accepted by ReportStore.query, each matching one indexed column
+FILTERS = {
+    "source_ip": "records.source_ip = ?",
+    "header_from": "records.header_from = ?",
+    "organization_name": "reports.organization_name = ?",
+    "from_date": "reports.date_range_begin >= ?",
+    "to_date": "reports.date_range_begin < ?",
+    "disposition": "records.policy_evaluated_disposition = ?",
+    "spf": "records.policy_evaluated_spf = ?",
+    "dkim": "records.policy_evaluated_dkim = ?",
+}
+CREATE_RECORDS = (
+    "CREATE TABLE IF NOT EXISTS records (report_id INTEGER, header_from TEXT, "
+    "source_ip TEXT, source_ip_version INTEGER, host_name TEXT, count INTEGER, "
+    "policy_evaluated_spf TEXT, policy_evaluated_dkim TEXT, "
+    "policy_evaluated_disposition TEXT, policy_evaluated_reason_type TEXT, "
+    "spf_domain TEXT, spf_result TEXT, dkim_domain TEXT, dkim_result TEXT)"
+)
+INSERT_RECORDS = "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+UPDATE_REPORTS = (
+    "UPDATE reports SET domain = ?, organization_name = ?, date_range_begin = ?, "
+    "date_range_end = ? WHERE id = ?"
+)
+# Selects the columns of writers.COLUMNS, in the same order
+SELECT_RECORDS = (
+    "SELECT reports.id, reports.domain, reports.organization_name, "
+    "reports.date_range_begin, reports.date_range_end, records.header_from, "
+    "records.source_ip, records.source_ip_version, records.host_name, "
+    "records.count, records.policy_evaluated_spf, records.policy_evaluated_dkim, "
+    "records.policy_evaluated_disposition, records.policy_evaluated_reason_type, "
+    "records.spf_domain, records.spf_result, records.dkim_domain, "
+    "records.dkim_result FROM records JOIN reports ON reports.id = records.report_id "
+    "WHERE "
+)
+
+
+class ReportStore:
+    """Durable local copy of full DMARC reports, keyed by report ID.
+
+    Besides the full report, the reporting organization and date range of each report
+    and the flattened rows of its records are kept in indexed tables, so that records
+    can be queried by date, organization, source IP and policy result.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open, or create, the store database at `path`."""
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.create_schema()
+
+    def create_schema(self) -> None:
+        """Create the tables and indexes, upgrading a store of bare reports."""
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY, body TEXT)"
+        )
+        existing = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(reports)")
+        }
+        upgrade = existing == {"id", "body"}
+        for column in INDEXED_REPORT_COLUMNS:
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE reports ADD COLUMN {column} TEXT")
+        self.connection.execute(CREATE_RECORDS)
+        for name, columns in INDEXES.items():
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+        if upgrade:
+            # Index any reports stored before the indexed columns existed
+            bodies = self.connection.execute("SELECT body FROM reports").fetchall()
+            self.index([json.loads(body) for (body,) in bodies])
+
+    def add(self, reports: Iterable[dict]) -> None:
+        """Store full reports, replacing any earlier copy with the same ID."""
+        with self.connection:
+            reports = list(reports)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO reports (id, body) VALUES (?, ?)",
+                ((report["id"], json.dumps(report)) for report in reports),
+            )
+            self.index(reports)
+
+    def index(self, reports: List[dict]) -> None:
+        """Fill the indexed columns and record rows of stored reports."""
+        first_record_column = len(REPORT_COLUMNS)
+        self.connection.executemany(
+            UPDATE_REPORTS,
+            (
+                tuple(report.get(column) for column in INDEXED_REPORT_COLUMNS)
+                + (report["id"],)
+                for report in reports
+            ),
+        )
+        self.connection.executemany(
+            "DELETE FROM records WHERE report_id = ?",
+            ((report["id"],) for report in reports),
+        )
+        self.connection.executemany(
+            INSERT_RECORDS,
+            (
+                (row[0],) + row[first_record_column:]
+                for report in reports
+                for row in flatten_report(report)
+            ),
+        )
+
+    def get(self, id: int) -> Optional[dict]:
+        """Return a stored report, or None if it has not been stored."""
+        row = self.connection.execute(
+            "SELECT body FROM reports WHERE id = ?", (id,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def query(
+        self, limit: Optional[int] = None, **filters: Optional[str]
+    ) -> List[Dict]:
+        """Return the flattened records matching all of the given filters.
+
+        Each filter in FILTERS selects records by one indexed column. Dates compare
+        against the start of the report's date range, formatted as YYYY-MM-DD.
+        """
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters {sorted(unknown)}, use {list(FILTERS)}.")
+
+        conditions = [
+            FILTERS[name] for name, value in filters.items() if value is not None
+        ]
+        params = [value for value in filters.values() if value is not None]
+        sql = SELECT_RECORDS + (" AND ".join(conditions) or "1")
+        sql += " ORDER BY reports.id LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        return [dict(zip(COLUMNS, row)) for row in self.connection.execute(sql, params)]
+
+    def last_id(self) -> Optional[int]:
+        """Return the highest stored report ID, or None if the store is empty."""
+        return self.connection.execute("SELECT MAX(id) FROM reports").fetchone()[0]
+
+    def count(self) -> int:
+        """Return the number of stored reports."""
+        return self.connection.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
@@ -0,0 +1,155 @@
+"""Aggregate DMARC report records into pass/fail statistics."""
+
+import csv
+import json
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from postdmarc.writers import COLUMNS, INTEGER_COLUMNS, flatten_report
+
+# Message counts kept for every group of records
+METRICS = (
+    "messages",
+    "spf_aligned",
+    "dkim_aligned",
+    "dmarc_pass",
+    "disposition_none",
+    "disposition_quarantine",
+    "disposition_reject",
+)
+# Groupings of the records, named after the column they are grouped by
+GROUPINGS = {
+    "source_ip": COLUMNS.index("source_ip"),
+    "organization_name": COLUMNS.index("organization_name"),
+    "header_from": COLUMNS.index("header_from"),
+    "disposition": COLUMNS.index("policy_evaluated_disposition"),
+    "day": COLUMNS.index("date_range_begin"),
+}
+REPORT_ID = COLUMNS.index("report_id")
+COUNT = COLUMNS.index("count")
+SPF = COLUMNS.index("policy_evaluated_spf")
+DKIM = COLUMNS.index("policy_evaluated_dkim")
+DISPOSITION = COLUMNS.index("policy_evaluated_disposition")
+
+
+class CounterTable:
+    """Counters of every metric for each distinct key, stored in one flat array.
+
+    The counters of the nth key seen are at positions n * len(METRICS) onwards, so
+    adding a record costs a dict lookup and a few integer additions.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty table."""
+        self.index: Dict[str, int] = {}
+        self.counts = array("q")
+
+    def add(self, key: str, increments: Sequence[int]) -> None:
+        """Add the metric increments of a record to the counters of `key`."""
+        position = self.index.get(key)
+        if position is None:
+            position = self.index[key] = len(self.counts)
+            self.counts.extend(increments)
+            return
+        for offset, increment in enumerate(increments):
+            self.counts[position + offset] += increment
+
+    def rows(self, top: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Return the counters of each key, with the most messages first."""
+        keys = sorted(self.index, key=lambda key: -self.counts[self.index[key]])
+        return {key: self.get(key) for key in keys[:top]}
+
+    def get(self, key: str) -> Dict[str, int]:
+        """Return the counters of a single key."""
+        position = self.index[key]
+        return {
+            metric: self.counts[position + offset]
+            for offset, metric in enumerate(METRICS)
+        }
+
+
+class ReportSummary:
+    """Streaming aggregation of report records in a single pass."""
+
+    def __init__(self) -> None:
+        """Create an empty summary."""
+        self.report_ids: set = set()
+        self.totals = array("q", bytes(8 * len(METRICS)))
+        self.tables = {grouping: CounterTable() for grouping in GROUPINGS}
+
+    def add_report(self, report: dict) -> None:
+        """Add every record of a full report."""
+        self.report_ids.add(report.get("id"))
+        for row in flatten_report(report):
+            self.add_row(row)
+
+    def add_row(self, row: Tuple) -> None:
+        """Add a single flattened record, with values in the order of COLUMNS."""
+        self.report_ids.add(row[REPORT_ID])
+        messages = row[COUNT] or 0
+        spf = row[SPF] == "pass"
+        dkim = row[DKIM] == "pass"
+        disposition = row[DISPOSITION]
+        increments = (
+            messages,
+            messages if spf else 0,
+            messages if dkim else 0,
+            messages if spf or dkim else 0,
+            messages if disposition == "none" else 0,
+            messages if disposition == "quarantine" else 0,
+            messages if disposition == "reject" else 0,
+        )
+        for offset, increment in enumerate(increments):
+            self.totals[offset] += increment
+        for grouping, column in GROUPINGS.items():
+            key = row[column]
+            if key is None:
+                key = "unknown"
+            elif grouping == "day":
+                key = key[:10]
+            self.tables[grouping].add(key, increments)
+
+    def result(self, top: Optional[int] = None) -> dict:
+        """Return the totals and the counters of each grouping.
+
+        Keyword Arguments:
+        top     Only include this many keys of each grouping, with the most messages.
+        """
+        result = {
+            "reports": len(self.report_ids),
+            "totals": dict(zip(METRICS, self.totals)),
+        }
+        for grouping, table in self.tables.items():
+            result[f"by_{grouping}"] = table.rows(top)
+        return result
+
+
+def iter_exported_rows(filepath: str) -> Iterator[Tuple]:
+    """Yield the flattened records of a file written by export_all_reports.
+
+    JSON Lines and CSV files are read a line at a time. JSON arrays have to be loaded
+    in full, so prefer the other formats for large exports.
+    """
+    if filepath.endswith(".csv"):
+        integer_columns = [COLUMNS.index(column) for column in INTEGER_COLUMNS]
+        with open(filepath, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                values = [value or None for value in row]
+                for column in integer_columns:
+                    if values[column] is not None:
+                        values[column] = int(values[column])
+                yield tuple(values)
+        return
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        if filepath.endswith(".jsonl"):
+            reports: Iterable = (json.loads(line) for line in f if line.strip())
+        else:
+            reports = json.load(f)
+        for report in reports:
+            # Exported reports are (status code, report) pairs
+            if isinstance(report, list):
+                report = report[1]
+            yield from flatten_report(report)
@@ -0,0 +1,193 @@
+"""Incremental file writers used to stream exported reports to disk."""
+
+import csv
+import json
+from typing import IO, Any, Callable, Dict, Iterator, List, Tuple, Type
+
+# Columns of the flattened exports, one row per record of each report
+REPORT_COLUMNS = (
+    "report_id",
+    "domain",
+    "organization_name",
+    "date_range_begin",
+    "date_range_end",
+)
+RECORD_COLUMNS = (
+    "header_from",
+    "source_ip",
+    "source_ip_version",
+    "host_name",
+    "count",
+    "policy_evaluated_spf",
+    "policy_evaluated_dkim",
+    "policy_evaluated_disposition",
+    "policy_evaluated_reason_type",
+    "spf_domain",
+    "spf_result",
+    "dkim_domain",
+    "dkim_result",
+)
+COLUMNS = REPORT_COLUMNS + RECORD_COLUMNS
+INTEGER_COLUMNS = ("report_id", "source_ip_version", "count")
+
+
+def flatten_report(report: dict) -> Iterator[Tuple]:
+    """Yield one row of COLUMNS for each record of a full report."""
+    report_values = (
+        report.get("id"),
+        report.get("domain"),
+        report.get("organization_name"),
+        report.get("date_range_begin"),
+        report.get("date_range_end"),
+    )
+    for record in report.get("records") or ():
+        yield report_values + tuple(record.get(column) for column in RECORD_COLUMNS)
+
+
+class JsonArrayWriter:
+    """Write reports as the elements of a single JSON array.
+
+    The output is identical to calling json.dump on the full list of reports, but each
+    report is written as soon as it is received. Pass the number of reports already in
+    the file as `count` to continue a partially written array, and a faster function
+    than json.dumps as `dumps` to serialize the reports with.
+    """
+
+    binary = False
+
+    def __init__(
+        self, f: IO[str], count: int = 0, dumps: Callable[[Any], str] = json.dumps
+    ) -> None:
+        """Open the JSON array."""
+        self.f = f
+        self.count = count
+        self.dumps = dumps
+        if not self.count:
+            self.f.write("[")
+
+    def write(self, report: Any) -> None:
+        """Append a report to the array."""
+        if self.count:
+            self.f.write(", ")
+        self.f.write(self.dumps(report))
+        self.count += 1
+
+    def close(self) -> None:
+        """Close the JSON array."""
+        self.f.write("]")
+
+
+class JsonLinesWriter:
+    """Write reports in the JSON Lines format, one report per line."""
+
+    binary = False
+
+    def __init__(
+        self, f: IO[str], count: int = 0, dumps: Callable[[Any], str] = json.dumps
+    ) -> None:
+        """Prepare to write to the file."""
+        self.f = f
+        self.count = count
+        self.dumps = dumps
+
+    def write(self, report: Any) -> None:
+        """Append a report as a new line."""
+        self.f.write(self.dumps(report) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        """Nothing needs to be written to finish a JSON Lines file."""
+        pass
+
+
+class CsvRecordWriter:
+    """Write the records of each report as flattened CSV rows.
+
+    Each row holds one record along with the ID, domain, reporting organization and
+    date range of its report, so the file can be loaded without walking nested JSON.
+    """
+
+    binary = False
+
+    def __init__(self, f: IO[str], count: int = 0) -> None:
+        """Write the header row, unless continuing a partially written file."""
+        self.writer = csv.writer(f)
+        self.count = count
+        if not self.count:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, report: Any) -> None:
+        """Append the rows of a downloaded report."""
+        self.writer.writerows(flatten_report(report.json))
+        self.count += 1
+
+    def close(self) -> None:
+        """Nothing needs to be written to finish a CSV file."""
+        pass
+
+
+class NpzRecordWriter:
+    """Write the flattened records of all reports as compressed NumPy columns.
+
+    The file holds one array per column of COLUMNS and can be loaded with numpy.load.
+    Columns are collected in memory and written when the writer is closed, so this
+    format cannot be resumed. Requires the optional numpy dependency.
+    """
+
+    binary = True
+
+    def __init__(self, f: IO[bytes], count: int = 0) -> None:
+        """Prepare empty columns."""
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "The npz format requires numpy. "
+                "Install it with 'pip install py-postdmarc[numpy]'."
+            )
+        self.numpy = numpy
+        self.f = f
+        self.count = count
+        self.columns: Dict[str, List] = {column: [] for column in COLUMNS}
+
+    def write(self, report: Any) -> None:
+        """Append the records of a downloaded report to the columns."""
+        for row in flatten_report(report.json):
+            for column, value in zip(COLUMNS, row):
+                self.columns[column].append(value)
+        self.count += 1
+
+    def close(self) -> None:
+        """Convert the columns to arrays and write them to the file."""
+        arrays = {}
+        for column, values in self.columns.items():
+            if column in INTEGER_COLUMNS:
+                values = [0 if value is None else value for value in values]
+                arrays[column] = self.numpy.array(values, dtype=self.numpy.int64)
+            else:
+                values = ["" if value is None else value for value in values]
+                arrays[column] = self.numpy.array(values, dtype=str)
+        self.numpy.savez_compressed(self.f, **arrays)
+
+
+EXPORT_FORMATS: Dict[str, Type] = {
+    "json": JsonArrayWriter,
+    "jsonl": JsonLinesWriter,
+    "csv": CsvRecordWriter,
+    "npz": NpzRecordWriter,
+}
+# Formats whose writers serialize reports with a `dumps` function
+JSON_FORMATS = ("json", "jsonl")
+
+
+def open_export(filepath: str, output_format: str, append: bool = False) -> IO:
+    """Open `filepath` for writing an export in `output_format`.
+
+    With `append`, the file is opened for continuing a partially written export.
+    Text exports are always UTF-8, whatever the locale, since report fields such as
+    the organization name may hold any character.
+    """
+    mode = "r+" if append else "w"
+    if EXPORT_FORMATS[output_format].binary:
+        return open(filepath, mode + "b")
+    return open(filepath, mode, encoding="utf-8", newline="")
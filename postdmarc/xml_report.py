@@ -0,0 +1,76 @@
+"""Incremental parser of raw DMARC aggregate report XML documents."""
+
+from typing import IO, Iterator, Optional, Union
+from xml.etree.ElementTree import Element, iterparse
+
+
+def local_name(tag: str) -> str:
+    """Strip the namespace, if any, from an element tag."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def find_first(element: Element, name: str) -> Optional[Element]:
+    """Return the first direct child named `name`, ignoring namespaces."""
+    return next((child for child in element if local_name(child.tag) == name), None)
+
+
+def find_text(element: Optional[Element], *path: str) -> Optional[str]:
+    """Return the text of the descendant along `path`, or None if there is none."""
+    for name in path:
+        if element is None:
+            return None
+        element = find_first(element, name)
+    if element is None or element.text is None:
+        return None
+    return element.text.strip() or None
+
+
+def parse_record(record: Element) -> dict:
+    """Convert a <record> element to the JSON representation of a record."""
+    row = find_first(record, "row")
+    auth_results = find_first(record, "auth_results")
+    source_ip = find_text(row, "source_ip")
+    count = find_text(row, "count")
+    return {
+        "header_from": find_text(record, "identifiers", "header_from"),
+        "source_ip": source_ip,
+        "source_ip_version": (
+            None if source_ip is None else 6 if ":" in source_ip else 4
+        ),
+        "host_name": None,
+        "count": None if count is None else int(count),
+        "policy_evaluated_spf": find_text(row, "policy_evaluated", "spf"),
+        "policy_evaluated_dkim": find_text(row, "policy_evaluated", "dkim"),
+        "policy_evaluated_disposition": find_text(
+            row, "policy_evaluated", "disposition"
+        ),
+        "policy_evaluated_reason_type": find_text(
+            row, "policy_evaluated", "reason", "type"
+        ),
+        "spf_domain": find_text(auth_results, "spf", "domain"),
+        "spf_result": find_text(auth_results, "spf", "result"),
+        "dkim_domain": find_text(auth_results, "dkim", "domain"),
+        "dkim_result": find_text(auth_results, "dkim", "result"),
+    }
+
+
+def iter_xml_records(source: Union[str, IO[bytes]]) -> Iterator[dict]:
+    """Yield the records of a DMARC aggregate report, in the JSON representation.
+
+    The document is parsed incrementally and each <record> element is discarded once
+    it has been converted, so memory use doesn't grow with the size of the report.
+    Records have the same keys as those of JSON reports, except that the host name
+    isn't part of the XML and is always None.
+
+    Arguments:
+    source  The path of an XML file, or a binary file object such as a streamed
+                response body.
+    """
+    root = None
+    for event, element in iterparse(source, events=("start", "end")):
+        if root is None:
+            root = element
+        elif event == "end" and local_name(element.tag) == "record":
+            yield parse_record(element)
+            # Drop the converted record, and any earlier siblings, from the tree
+            root.clear()
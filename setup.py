@@ -20,5 +20,17 @@ setup(
     url="https://github.com/scuriosity/py-postdmarc",
     packages=find_packages(),
     install_requires=["dateparser>=0.7,<1.0", "requests>=2.0.0,<3.0", "fire>=0.3"],
-    entry_points={"console_scripts": ["postdmarc = postdmarc.postdmarc:main"]},
+    extras_require={
+        "async": ["httpx>=0.18"],
+        "brotli": ["urllib3[brotli]"],
+        "dns": ["dnspython>=2.0"],
+        "numpy": ["numpy>=1.17"],
+        "orjson": ["orjson>=3.0"],
+    },
+    entry_points={
+        "console_scripts": [
+            "postdmarc = postdmarc.postdmarc:main",
+            "postdmarc-fleet = postdmarc.fleet:main",
+        ]
+    },
 )
@@ -0,0 +1,21 @@
+"""Stand-ins for the API shared by the test modules."""
+
+import io
+import json
+
+import requests
+
+
+def fake_response(status_code, body=None, headers=None, content=None):
+    """Build a response as the session would receive it.
+
+    The body is `body` encoded as JSON, or the raw bytes of `content`. It is read from
+    `raw` like that of a real connection, so it can be streamed too.
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    if content is None:
+        content = b"" if body is None else json.dumps(body).encode()
+    response.raw = io.BytesIO(content)
+    return response
@@ -0,0 +1,156 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import postdmarc.async_postdmarc as apdm
+import postdmarc.pdm_exceptions as errors
+
+# A listing of two reports on a single page, by the cursor it is requested with
+PAGES = {None: {"meta": {"next": None}, "entries": [{"id": 1}, {"id": 2}]}}
+
+
+def fake_get(pages):
+    """Build a stand-in for AsyncClient.get, serving `pages` of the report listing.
+
+    Report requests are answered with the ID of the report alone.
+    """
+
+    async def get(url, params=None, headers=None):
+        if url.endswith("/reports"):
+            return apdm.httpx.Response(200, json=pages[(params or {}).get("after")])
+        return apdm.httpx.Response(200, json={"id": int(url.rsplit("/", 1)[1])})
+
+    return get
+
+
+@unittest.skipIf(apdm.httpx is None, "httpx is not installed")
+class TestAsyncResponse(unittest.IsolatedAsyncioTestCase):
+    """Test that each of the API requests are handled correctly."""
+
+    async def asyncSetUp(self):
+        self.connection = apdm.AsyncPostDmarc()
+
+    async def asyncTearDown(self):
+        await self.connection.aclose()
+
+    @patch.object(apdm.httpx.AsyncClient, "post")
+    async def test_status_code_500(self, mock_post):
+        """Test that an exception is raised on internal server error."""
+        mock_post.return_value = apdm.httpx.Response(
+            500, json={"message": "Server error"}
+        )
+        with self.assertRaises(errors.InternalServerError):
+            await self.connection.create_record("tema@wildbit.com", "postmarkapp.com")
+
+    @patch.object(apdm.httpx.AsyncClient, "post")
+    async def test_create_record_is_unauthenticated(self, mock_post):
+        mock_post.return_value = apdm.httpx.Response(
+            200, json={"domain": "postmarkapp.com"}
+        )
+        response = await self.connection.create_record(
+            "tema@wildbit.com", "postmarkapp.com"
+        )
+        self.assertEqual(response, (200, {"domain": "postmarkapp.com"}))
+        self.assertNotIn("headers", mock_post.call_args.kwargs)
+
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_get_record(self, mock_get):
+        mock_get.return_value = apdm.httpx.Response(
+            200, json={"domain": "postmarkapp.com"}
+        )
+        response = await self.connection.get_record()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"]["X-Api-Token"],
+            self.connection.api_key,
+        )
+
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_api_key_and_endpoint(self, mock_get):
+        """Ensure each client can have its own key, for one client per domain."""
+        mock_get.return_value = apdm.httpx.Response(200, json={"domain": "wildbit.com"})
+        async with apdm.AsyncPostDmarc(
+            api_key="key-wildbit", endpoint="http://127.0.0.1:8025/"
+        ) as client:
+            await client.get_record()
+        self.assertEqual(mock_get.call_args.args[0], "http://127.0.0.1:8025/records/my")
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"]["X-Api-Token"], "key-wildbit"
+        )
+
+    @patch.object(apdm.asyncio, "sleep")
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_retry(self, mock_get, mock_sleep):
+        """Ensure transient failures are retried, honoring Retry-After."""
+        mock_get.side_effect = [
+            apdm.httpx.ConnectError("refused"),
+            apdm.httpx.Response(429, headers={"Retry-After": "7"}),
+            apdm.httpx.Response(200, json={"domain": "wildbit.com"}),
+        ]
+        response = await self.connection.get_record()
+        self.assertEqual(response, (200, {"domain": "wildbit.com"}))
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_args.args[0], 7.0)
+
+        mock_get.reset_mock()
+        mock_get.side_effect = [
+            apdm.httpx.ReadTimeout("stalled"),
+            apdm.httpx.Response(200, json={"domain": "wildbit.com"}),
+        ]
+        await self.connection.get_record()
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(
+            self.connection.client.timeout, apdm.httpx.Timeout(apdm.DEFAULT_TIMEOUT)
+        )
+
+        mock_get.reset_mock()
+        mock_get.side_effect = None
+        mock_get.return_value = apdm.httpx.Response(500, json={"message": "Busy"})
+        with self.assertRaises(errors.InternalServerError):
+            await self.connection.get_record()
+        self.assertEqual(mock_get.call_count, 3)
+
+        mock_get.reset_mock()
+        mock_get.return_value = apdm.httpx.Response(
+            429, headers={"Retry-After": "86400"}, json={"message": "Slow down"}
+        )
+        with self.assertRaises(errors.TooManyRequestsError):
+            await self.connection.get_record()
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_iter_reports(self, mock_get):
+        mock_get.side_effect = [
+            apdm.httpx.Response(
+                200, json={"meta": {"next": 2}, "entries": [{"id": 1}]}
+            ),
+            apdm.httpx.Response(
+                200, json={"meta": {"next": None}, "entries": [{"id": 2}]}
+            ),
+        ]
+        ids = [entry["id"] async for entry in self.connection.iter_reports()]
+        self.assertEqual(ids, [1, 2])
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"after": 2})
+
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_export_all_reports(self, mock_get):
+        mock_get.side_effect = fake_get(PAGES)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.json")
+            await self.connection.export_all_reports(
+                "2020-01-01", "2020-01-08", filepath, concurrency=2
+            )
+            with open(filepath) as f:
+                output = json.load(f)
+        self.assertEqual(output, [[200, {"id": 1}], [200, {"id": 2}]])
+
+    @patch.object(apdm.httpx.AsyncClient, "get")
+    async def test_iter_report_details(self, mock_get):
+        mock_get.side_effect = fake_get(PAGES)
+        reports = [
+            report
+            async for report in self.connection.iter_report_details(concurrency=2)
+        ]
+        self.assertEqual(reports, [(200, {"id": 1}), (200, {"id": 2})])
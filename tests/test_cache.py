@@ -0,0 +1,85 @@
+import itertools
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import postdmarc.cache as cache_module
+from postdmarc.cache import ReportCache
+
+
+class TestReportCache(unittest.TestCase):
+    """Test the on-disk report cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_and_miss(self):
+        """Ensure cached reports are returned and lookups are counted."""
+        cache = ReportCache(self.path)
+        self.assertIsNone(cache.get(276))
+        cache.put(276, {"id": 276, "records": []})
+        self.assertEqual(cache.get(276), {"id": 276, "records": []})
+        self.assertEqual(
+            cache.stats(),
+            {
+                "hits": 1,
+                "misses": 1,
+                "entries": 1,
+                "size_bytes": len(json.dumps({"id": 276, "records": []})),
+            },
+        )
+        cache.close()
+
+    def test_persistence(self):
+        """Ensure cached reports survive reopening the cache."""
+        cache = ReportCache(self.path)
+        cache.put(1, {"id": 1})
+        cache.close()
+
+        cache = ReportCache(self.path)
+        self.assertEqual(cache.get(1), {"id": 1})
+        self.assertEqual(cache.stats()["size_bytes"], len(json.dumps({"id": 1})))
+        cache.close()
+
+    @patch.object(cache_module.time, "time", side_effect=itertools.count())
+    def test_hits_are_not_written(self, mock_time):
+        """Ensure reading a report doesn't write to the database."""
+        cache = ReportCache(self.path)
+        cache.put(1, {"id": 1})
+        cache.put(2, {"id": 2})
+        changes = cache.connection.total_changes
+        for _ in range(10):
+            cache.get(1)
+        self.assertEqual(cache.connection.total_changes, changes)
+        self.assertFalse(cache.connection.in_transaction)
+
+        # The access time is saved with the next report stored, or on closing
+        cache.put(3, {"id": 3})
+        order = cache.connection.execute("SELECT id FROM reports ORDER BY accessed")
+        self.assertEqual([id for id, in order], [2, 1, 3])
+        cache.get(2)
+        cache.close()
+        cache = ReportCache(self.path)
+        order = cache.connection.execute("SELECT id FROM reports ORDER BY accessed")
+        self.assertEqual([id for id, in order], [1, 3, 2])
+        cache.close()
+
+    def test_eviction(self):
+        """Ensure the least recently used reports are evicted first."""
+        size = len(json.dumps({"id": 1}))
+        cache = ReportCache(self.path, max_bytes=2 * size)
+        cache.put(1, {"id": 1})
+        cache.put(2, {"id": 2})
+        cache.get(1)
+        cache.put(3, {"id": 3})
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(cache.stats()["size_bytes"], 2 * size)
+        cache.close()
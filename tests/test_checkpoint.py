@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+
+from postdmarc.checkpoint import ExportCheckpoint
+
+
+class TestExportCheckpoint(unittest.TestCase):
+    """Test saving and loading the progress of an export."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.tmp.name, "reports.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cursor(self):
+        checkpoint = ExportCheckpoint(self.filepath, from_date="2020-01-01")
+        for page in range(100):
+            checkpoint.update(page, range(page * 30, page * 30 + 30), page, page)
+        # Only the cursor is saved, so the checkpoint doesn't grow with the export
+        with open(checkpoint.path) as f:
+            self.assertLess(len(f.read()), 200)
+        self.assertFalse(os.path.exists(checkpoint.ids_path))
+
+        loaded = ExportCheckpoint(self.filepath, from_date="2020-01-01")
+        self.assertTrue(loaded.load())
+        self.assertEqual((loaded.after, loaded.count, loaded.fetched), (99, 99, set()))
+        self.assertFalse(loaded.finished)
+        with self.assertRaises(ValueError):
+            ExportCheckpoint(self.filepath, from_date="2020-02-01").load()
+
+    def test_finished(self):
+        checkpoint = ExportCheckpoint(self.filepath)
+        checkpoint.update(None, [1, 2], 10, 2)
+        # The cursor of the last page is None, as it is before the first page
+        loaded = ExportCheckpoint(self.filepath)
+        loaded.load()
+        self.assertTrue(loaded.finished)
+
+        checkpoint = ExportCheckpoint(self.filepath, track_ids=True)
+        checkpoint.update(None, [1, 2], 10, 2)
+        self.assertFalse(checkpoint.finished)
+
+    def test_track_ids(self):
+        checkpoint = ExportCheckpoint(self.filepath, track_ids=True)
+        checkpoint.update(None, [1, 2, 3], 10, 3)
+        checkpoint.update(None, [7, 8], 20, 5)
+        with open(checkpoint.path) as f:
+            self.assertNotIn("fetched", json.load(f))
+        # IDs logged by a page whose checkpoint was never saved are ignored
+        with open(checkpoint.ids_path, "a") as f:
+            f.write("9\n10\n")
+
+        loaded = ExportCheckpoint(self.filepath, track_ids=True)
+        loaded.load()
+        self.assertEqual(loaded.fetched, {1, 2, 3, 7, 8})
+        loaded.update(None, [11], 30, 6)
+        with open(loaded.ids_path) as f:
+            self.assertEqual(f.read().split(), ["1", "2", "3", "7", "8", "11"])
+
+        loaded.remove()
+        self.assertFalse(os.path.exists(loaded.path))
+        self.assertFalse(os.path.exists(loaded.ids_path))
+
+    def test_fresh_export_clears_ids(self):
+        ExportCheckpoint(self.filepath, track_ids=True).update(None, [1, 2], 10, 2)
+        checkpoint = ExportCheckpoint(self.filepath, track_ids=True)
+        checkpoint.update(None, [5], 5, 1)
+        with open(checkpoint.ids_path) as f:
+            self.assertEqual(f.read().split(), ["5"])
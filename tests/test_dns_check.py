@@ -0,0 +1,87 @@
+import unittest
+
+from postdmarc import dns_check
+
+EXPECTED = "v=DMARC1; p=none; pct=100; rua=mailto:re+x@dmarc.postmarkapp.com; sp=none;"
+
+
+def stub_resolver(records):
+    """Build a resolver answering every lookup with `records`."""
+
+    def resolve(name):
+        if isinstance(records, Exception):
+            raise records
+        return records
+
+    return resolve
+
+
+class TestDnsCheck(unittest.TestCase):
+    """Test the comparison of published DMARC records to the expected one."""
+
+    def check(self, records):
+        return dns_check.check_dmarc_record(
+            "_dmarc.wildbit.com.", EXPECTED, stub_resolver(records)
+        )
+
+    def test_match(self):
+        reordered = (
+            "v=DMARC1;p=none; sp=none; rua=mailto:re+x@dmarc.postmarkapp.com;pct=100"
+        )
+        check = self.check(["google-site-verification=abc", reordered])
+        self.assertEqual(check.status, dns_check.MATCH)
+        self.assertEqual(check.found, [reordered])
+
+    def test_quoted_snippet(self):
+        """Ensure the escaped quotes of the API's DNS snippet are not compared."""
+        snippet = (
+            r"\"v=DMARC1; p=none; pct=100; "
+            r"rua=mailto:randomhash+1mSgKNr7scM@inbound.postmarkapp.com; "
+            r"sp=none; aspf=r;\""
+        )
+        published = (
+            "v=DMARC1; p=none; pct=100; "
+            "rua=mailto:randomhash+1mSgKNr7scM@inbound.postmarkapp.com; "
+            "sp=none; aspf=r;"
+        )
+        check = dns_check.check_dmarc_record(
+            "_dmarc.wildbit.com.", snippet, stub_resolver([published])
+        )
+        self.assertEqual(check.status, dns_check.MATCH)
+        self.assertEqual(check.expected, published)
+        split = dns_check.unquote_record('"v=DMARC1; " "p=none;"')
+        self.assertEqual(split, "v=DMARC1; p=none;")
+
+    def test_different(self):
+        """Ensure records reporting to Postmark pass despite other changes."""
+        stricter = EXPECTED.replace("p=none", "p=reject").replace(
+            "sp=none", "sp=reject"
+        )
+        second_address = (
+            "v=DMARC1; p=none; pct=100; sp=none; "
+            "rua=mailto:dmarc@wildbit.com,MAILTO:re+x@dmarc.postmarkapp.com!10m"
+        )
+        for record in (stricter, second_address):
+            with self.subTest(record=record):
+                self.assertEqual(self.check([record]).status, dns_check.DIFFERENT)
+                self.assertIn(self.check([record]).status, dns_check.VERIFIABLE)
+
+    def test_mismatch(self):
+        check = self.check(["v=DMARC1; p=reject;"])
+        self.assertEqual(check.status, dns_check.MISMATCH)
+        other_address = EXPECTED.replace("re+x@", "re+y@")
+        self.assertEqual(self.check([other_address]).status, dns_check.MISMATCH)
+        self.assertNotIn(dns_check.MISMATCH, dns_check.VERIFIABLE)
+
+    def test_several_records(self):
+        check = self.check([EXPECTED, EXPECTED])
+        self.assertEqual(check.status, dns_check.MISMATCH)
+
+    def test_missing(self):
+        self.assertEqual(self.check([]).status, dns_check.MISSING)
+        self.assertEqual(self.check(["spf1"]).status, dns_check.MISSING)
+
+    def test_lookup_failure(self):
+        check = self.check(TimeoutError("no answer"))
+        self.assertEqual(check.status, dns_check.UNKNOWN)
+        self.assertEqual(check.error, "TimeoutError: no answer")
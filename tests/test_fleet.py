@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import postdmarc.pdm_exceptions as errors
+import postdmarc.postdmarc as pdm
+from postdmarc.fleet import PostDmarcFleet, load_config
+from tests.helpers import fake_response
+
+KEYS = {"wildbit.com": "key-wildbit", "postmarkapp.com": "key-postmark"}
+
+
+def fake_get(session, url, params=None, headers=None, timeout=None):
+    """Answer with the API key of the requesting session, failing for one key."""
+    token = session.headers["X-Api-Token"]
+    if token == "key-broken":
+        return fake_response(401, {"message": "Invalid API key"})
+    if url.endswith("/reports"):
+        return fake_response(200, {"meta": {"next": None}, "entries": [{"id": 1}]})
+    return fake_response(200, {"token": token})
+
+
+class TestFleet(unittest.TestCase):
+    """Test calls across many domains."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp.name, "domains.json")
+        with open(self.config_path, "w") as f:
+            json.dump(KEYS, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_config(self):
+        self.assertEqual(load_config(self.config_path), KEYS)
+        with open(self.config_path, "w") as f:
+            json.dump(["key-wildbit"], f)
+        self.assertRaises(ValueError, load_config, self.config_path)
+
+    @patch.object(pdm.requests.Session, "get", autospec=True, side_effect=fake_get)
+    def test_per_domain_keys(self, mock_get):
+        """Ensure every domain is called with its own API key."""
+        fleet = PostDmarcFleet(self.config_path)
+        result = fleet.get_record()
+        self.assertEqual(result.errors, {})
+        self.assertEqual(
+            {
+                domain: response.json["token"]
+                for domain, response in result.results.items()
+            },
+            KEYS,
+        )
+        self.assertIsNot(
+            fleet.clients["wildbit.com"].session,
+            fleet.clients["postmarkapp.com"].session,
+        )
+
+    @patch.object(pdm.requests.Session, "get", autospec=True, side_effect=fake_get)
+    def test_errors(self, mock_get):
+        """Ensure one failing domain doesn't abort the others."""
+        with open(self.config_path, "w") as f:
+            json.dump({**KEYS, "broken.com": "key-broken"}, f)
+        result = PostDmarcFleet(self.config_path).list_reports()
+        self.assertEqual(set(result.results), set(KEYS))
+        self.assertIsInstance(result.errors["broken.com"], errors.APIKeyInvalidError)
+
+    @patch.object(pdm.requests.Session, "get", autospec=True, side_effect=fake_get)
+    def test_export_all_reports(self, mock_get):
+        fleet = PostDmarcFleet(self.config_path, concurrency=2)
+        filepath = os.path.join(self.tmp.name, "reports-{domain}.json")
+        result = fleet.export_all_reports("2020-01-01", "2020-01-08", filepath)
+        self.assertEqual(result.errors, {})
+        for domain, key in KEYS.items():
+            with open(filepath.format(domain=domain)) as f:
+                self.assertEqual(json.load(f), [[200, {"token": key}]])
+        self.assertRaises(
+            ValueError,
+            fleet.export_all_reports,
+            "2020-01-01",
+            "2020-01-08",
+            "reports.json",
+        )
+
+
+class TestFleetDnsPrecheck(unittest.TestCase):
+    """Test that batch DNS verification skips domains failing the local check."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.tmp.name, "domains.json")
+        with open(self.config_path, "w") as f:
+            json.dump({**KEYS, "broken.com": "key-broken-dns"}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch.object(pdm.requests.Session, "post", autospec=True)
+    @patch.object(pdm.requests.Session, "get", autospec=True)
+    def test_precheck(self, mock_get, mock_post):
+        def fake_snippet(session, url, params=None, headers=None, timeout=None):
+            domain = "broken.com"
+            if session.headers["X-Api-Token"] != "key-broken-dns":
+                domain = "wildbit.com"
+            return fake_response(
+                200, {"name": f"_dmarc.{domain}.", "value": "v=DMARC1; p=none;"}
+            )
+
+        def resolver(name):
+            return ["v=DMARC1; p=none"] if name == "_dmarc.wildbit.com." else []
+
+        mock_get.side_effect = fake_snippet
+        mock_post.return_value = fake_response(200, {"verified": True})
+        result = PostDmarcFleet(self.config_path).verify_dns(
+            precheck=True, resolver=resolver
+        )
+
+        self.assertEqual(result.errors, {})
+        self.assertEqual(result.results["wildbit.com"].check.status, "match")
+        self.assertEqual(
+            result.results["wildbit.com"].response, (200, {"verified": True})
+        )
+        self.assertEqual(result.results["broken.com"].check.status, "missing")
+        self.assertIsNone(result.results["broken.com"].response)
+        # Only the domains that passed the local check were verified by the API
+        self.assertEqual(mock_post.call_count, 2)
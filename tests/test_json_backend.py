@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+import postdmarc.postdmarc as pdm
+from postdmarc import writers
+from postdmarc.json_backend import STDLIB_BACKEND, get_backend
+from postdmarc.postdmarc import ResponseTuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+REPORT = {"id": 276, "domain": "wildbit.com", "records": [{"count": 3}]}
+
+
+class TestJsonBackend(unittest.TestCase):
+    """Test the selection and use of JSON backends."""
+
+    def test_stdlib(self):
+        self.assertIs(get_backend("json"), STDLIB_BACKEND)
+        with self.assertRaises(ValueError):
+            get_backend("simplejson")
+
+    @patch.dict("sys.modules", {"orjson": None})
+    def test_orjson_missing(self):
+        self.assertIs(get_backend("auto"), STDLIB_BACKEND)
+        with self.assertRaises(ImportError):
+            get_backend("orjson")
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson(self):
+        backend = get_backend("auto")
+        self.assertEqual(backend.name, "orjson")
+        self.assertEqual(backend.loads(json.dumps(REPORT).encode()), REPORT)
+        self.assertEqual(
+            json.loads(backend.dumps(ResponseTuple(200, REPORT))), [200, REPORT]
+        )
+
+    def test_writers(self):
+        for backend in ("json", "auto"):
+            dumps = get_backend(backend).dumps
+            with self.subTest(backend=backend):
+                f = io.StringIO()
+                writer = writers.JsonArrayWriter(f, dumps=dumps)
+                writer.write(ResponseTuple(200, REPORT))
+                writer.write(ResponseTuple(200, REPORT))
+                writer.close()
+                self.assertEqual(json.loads(f.getvalue()), [[200, REPORT]] * 2)
+
+                f = io.StringIO()
+                writer = writers.JsonLinesWriter(f, dumps=dumps)
+                writer.write(ResponseTuple(200, REPORT))
+                lines = f.getvalue().splitlines()
+                self.assertEqual([json.loads(line) for line in lines], [[200, REPORT]])
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_decode_response(self, mock_get):
+        response = pdm.requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(REPORT).encode()
+        mock_get.return_value = response
+        for backend in ("json", "auto"):
+            with self.subTest(backend=backend):
+                connection = pdm.PostDmarc(api_key="test", json_backend=backend)
+                self.assertEqual(connection.get_report(276), (200, REPORT))
+
+
+class TestExportEncoding(unittest.TestCase):
+    """Ensure exports hold any character, whatever the locale's encoding."""
+
+    def test_non_ascii_export(self):
+        script = """if True:
+            import os, tempfile
+            from postdmarc import writers
+            from postdmarc.json_backend import get_backend
+            from postdmarc.postdmarc import ResponseTuple
+            from postdmarc.summary import iter_exported_rows
+
+            report = {
+                "id": 1,
+                "organization_name": "Mail.Ru \\u90ae\\u4ef6",
+                "records": [{"source_ip": "10.0.0.1", "count": 1}],
+            }
+            with tempfile.TemporaryDirectory() as tmp:
+                for backend in ("json", "auto"):
+                    for output_format in ("jsonl", "csv"):
+                        filepath = os.path.join(tmp, f"{backend}.{output_format}")
+                        with writers.open_export(filepath, output_format) as f:
+                            writer = writers.EXPORT_FORMATS[output_format](f)
+                            if output_format in writers.JSON_FORMATS:
+                                writer.dumps = get_backend(backend).dumps
+                            writer.write(ResponseTuple(200, report))
+                            writer.close()
+                        rows = list(iter_exported_rows(filepath))
+                        assert rows[0][2] == "Mail.Ru \\u90ae\\u4ef6", rows
+        """
+        env = {
+            **os.environ,
+            "LC_ALL": "C",
+            "PYTHONUTF8": "0",
+            "PYTHONCOERCECLOCALE": "0",
+        }
+        env.pop("PYTHONIOENCODING", None)
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            env=env,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
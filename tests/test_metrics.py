@@ -0,0 +1,59 @@
+import unittest
+
+from postdmarc import metrics
+
+
+def event(endpoint="/records/my/reports/{id}", attempt=1, status_code=200, seconds=0.2):
+    return metrics.RequestEvent("get", endpoint, attempt, status_code, seconds, 100)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the collection and export of request metrics."""
+
+    def setUp(self):
+        self.metrics = metrics.RequestMetrics()
+        self.metrics(event(status_code=503, seconds=0.07))
+        self.metrics(event(attempt=2, seconds=0.2))
+        self.metrics(event(attempt=3, status_code=None, seconds=30))
+        self.metrics(event(endpoint="/records/my"))
+
+    def test_endpoint_template(self):
+        self.assertEqual(
+            metrics.endpoint_template("/records/my/reports/276"),
+            "/records/my/reports/{id}",
+        )
+        self.assertEqual(metrics.endpoint_template("/records/my"), "/records/my")
+
+    def test_summary(self):
+        summary = self.metrics.summary()
+        self.assertEqual(
+            list(summary), ["GET /records/my", "GET /records/my/reports/{id}"]
+        )
+        reports = summary["GET /records/my/reports/{id}"]
+        self.assertEqual(reports["requests"], 3)
+        self.assertEqual(reports["retries"], 2)
+        self.assertEqual(reports["errors"], 1)
+        self.assertEqual(reports["statuses"], {503: 1, 200: 1})
+        self.assertEqual(reports["bytes_received"], 300)
+        self.assertEqual(reports["seconds_p50"], 0.25)
+        self.assertEqual(reports["seconds_p95"], float("inf"))
+
+    def test_prometheus(self):
+        text = self.metrics.prometheus()
+        labels = 'method="GET",endpoint="/records/my/reports/{id}"'
+        self.assertIn("# TYPE postdmarc_requests_total counter", text)
+        self.assertIn(f'postdmarc_requests_total{{{labels},status="503"}} 1', text)
+        self.assertIn(f'postdmarc_requests_total{{{labels},status="error"}} 1', text)
+        self.assertIn(f"postdmarc_retries_total{{{labels}}} 2", text)
+        self.assertIn(f"postdmarc_response_bytes_total{{{labels}}} 300", text)
+        self.assertIn(
+            f'postdmarc_request_duration_seconds_bucket{{{labels},le="0.1"}} 1', text
+        )
+        self.assertIn(
+            f'postdmarc_request_duration_seconds_bucket{{{labels},le="0.25"}} 2', text
+        )
+        self.assertIn(
+            f'postdmarc_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3', text
+        )
+        self.assertIn(f"postdmarc_request_duration_seconds_count{{{labels}}} 3", text)
+        self.assertTrue(text.endswith("\n"))
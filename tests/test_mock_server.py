@@ -0,0 +1,267 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import postdmarc.pdm_exceptions as errors
+import postdmarc.postdmarc as pdm
+from postdmarc import writers
+from postdmarc.mock_server import API_KEY, MockDmarcServer
+
+
+class TestMockServer(unittest.TestCase):
+    """Test the client against the local mock of the DMARC API."""
+
+    def serve(self, **config):
+        server = MockDmarcServer(**config)
+        server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        return server, pdm.PostDmarc(api_key=API_KEY, endpoint=server.url)
+
+    def test_pagination(self):
+        server, client = self.serve(reports=120, reports_per_day=10)
+        ids = [entry["id"] for entry in client.iter_reports(limit=50)]
+        self.assertEqual(ids, list(range(1, 121)))
+        self.assertEqual(server.requests[("GET", "/records/my/reports")], 3)
+
+    def test_date_filter(self):
+        _, client = self.serve(reports=100, reports_per_day=10)
+        response = client.list_reports("2020-01-03", "2020-01-05", limit=50)
+        self.assertEqual(response.json["meta"]["total"], 20)
+        self.assertEqual(response.json["entries"][0]["id"], 21)
+        self.assertEqual(response.json["entries"][0]["created_at"][:10], "2020-01-03")
+
+    def test_export_all_reports(self):
+        _, client = self.serve(reports=40, records_per_report=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.jsonl")
+            client.export_all_reports(
+                "2020-01-01",
+                "2020-02-01",
+                filepath,
+                concurrency=4,
+                output_format="jsonl",
+            )
+            with open(filepath) as f:
+                reports = [json.loads(line) for line in f]
+        self.assertEqual([report[1]["id"] for report in reports], list(range(1, 41)))
+        self.assertEqual(len(reports[0][1]["records"]), 3)
+
+    def test_sharded_export(self):
+        for shard_days, listing_requests in ((1, 31), (31, None)):
+            with self.subTest(shard_days=shard_days):
+                server, client = self.serve(reports=300, reports_per_day=10)
+                with tempfile.TemporaryDirectory() as tmp:
+                    filepath = os.path.join(tmp, "reports.jsonl")
+                    client.export_all_reports(
+                        "2020-01-01",
+                        "2020-02-01",
+                        filepath,
+                        concurrency=4,
+                        output_format="jsonl",
+                        shard_days=shard_days,
+                    )
+                    with open(filepath) as f:
+                        ids = [json.loads(line)[1]["id"] for line in f]
+                self.assertEqual(ids, list(range(1, 301)))
+                if listing_requests is not None:
+                    self.assertEqual(
+                        server.requests[("GET", "/records/my/reports")],
+                        listing_requests,
+                    )
+
+    def test_sharded_export_resume(self):
+        server, client = self.serve(reports=60, reports_per_day=10)
+        get_report = client.get_report
+        failures = []
+
+        def fail_once(id):
+            if id == 35 and not failures:
+                failures.append(id)
+                raise errors.InternalServerError("Server error")
+            return get_report(id)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.jsonl")
+            options = {"output_format": "jsonl", "concurrency": 2, "shard_days": 2}
+            with patch.object(client, "get_report", side_effect=fail_once):
+                with self.assertRaises(errors.InternalServerError):
+                    client.export_all_reports(
+                        "2020-01-01", "2020-01-07", filepath, **options
+                    )
+                client.export_all_reports(
+                    "2020-01-01", "2020-01-07", filepath, resume=True, **options
+                )
+            with open(filepath) as f:
+                ids = [json.loads(line)[1]["id"] for line in f]
+            self.assertFalse(os.path.exists(f"{filepath}.checkpoint.ids"))
+        self.assertEqual(ids, list(range(1, 61)))
+
+    def test_export_resume_after_last_page(self):
+        """Ensure an export interrupted after its last page isn't listed again."""
+        for output_format in ("json", "jsonl"):
+            with self.subTest(output_format=output_format):
+                server, client = self.serve(reports=100)
+                writer_type = writers.EXPORT_FORMATS[output_format]
+                with tempfile.TemporaryDirectory() as tmp:
+                    filepath = os.path.join(tmp, f"reports.{output_format}")
+                    with patch.object(writer_type, "close", side_effect=OSError):
+                        with self.assertRaises(OSError):
+                            client.export_all_reports(
+                                "2020-01-01",
+                                "2020-02-01",
+                                filepath,
+                                output_format=output_format,
+                            )
+                    listed = server.requests[("GET", "/records/my/reports")]
+                    client.export_all_reports(
+                        "2020-01-01",
+                        "2020-02-01",
+                        filepath,
+                        output_format=output_format,
+                        resume=True,
+                    )
+                    with open(filepath) as f:
+                        if output_format == "json":
+                            reports = json.load(f)
+                        else:
+                            reports = [json.loads(line) for line in f]
+                    self.assertFalse(os.path.exists(f"{filepath}.checkpoint"))
+                self.assertEqual(
+                    [report[1]["id"] for report in reports], list(range(1, 101))
+                )
+                self.assertEqual(
+                    server.requests[("GET", "/records/my/reports")], listed
+                )
+
+    def test_report_model(self):
+        _, client = self.serve(reports=20, records_per_report=4)
+        status_code, report = client.get_report(3, model=True)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(report.id, 3)
+        self.assertEqual(report.to_dict(), client.get_report(3).json)
+        self.assertEqual(len(report.records), 4)
+
+        reports = list(
+            client.iter_report_details(
+                "2020-01-01", "2020-02-01", concurrency=2, model=True
+            )
+        )
+        self.assertEqual([report.json.id for report in reports], list(range(1, 21)))
+        with self.assertRaises(errors.BadRequestError):
+            client.get_report(3, fmt="xml", model=True)
+
+    def test_watch(self):
+        """Ensure each poll hands over only the reports received since the last."""
+        server, client = self.serve(reports=10)
+        delays = []
+
+        def receive_reports(delay):
+            delays.append(delay)
+            config = server.api.config
+            server.api.config = config._replace(reports=config.reports + 5)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "new.jsonl")
+            store_path = os.path.join(tmp, "reports.db")
+            with patch.object(pdm.time, "sleep", side_effect=receive_reports):
+                stats = client.watch(
+                    interval=60,
+                    filepath=filepath,
+                    store_path=store_path,
+                    max_polls=3,
+                )
+            with open(filepath) as f:
+                ids = [json.loads(line)[1]["id"] for line in f]
+            stored = client.query(store_path)
+
+        self.assertEqual(ids, list(range(11, 21)))
+        self.assertEqual({record["report_id"] for record in stored}, set(ids))
+        self.assertEqual(
+            stats, {"polls": 3, "failed_polls": 0, "new_reports": 10, "last_id": 20}
+        )
+        # The newest report is looked up once, then each poll is a single request
+        self.assertEqual(server.requests[("GET", "/records/my/reports")], 4)
+        self.assertEqual(len(delays), 2)
+        for delay in delays:
+            self.assertTrue(0 < delay <= 66)
+
+    @patch.object(pdm.time, "sleep")
+    def test_watch_stdout(self, mock_sleep):
+        _, client = self.serve(reports=10)
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout, patch(
+            "sys.stderr", new_callable=io.StringIO
+        ) as stderr:
+            self.assertIsNone(client.watch(after=5, max_polls=1))
+        ids = [json.loads(line)[1]["id"] for line in stdout.getvalue().splitlines()]
+        self.assertEqual(ids, [6, 7, 8, 9, 10])
+        self.assertEqual(json.loads(stderr.getvalue())["last_id"], 10)
+        mock_sleep.assert_not_called()
+
+    @patch.object(pdm.time, "sleep")
+    def test_watch_failed_poll(self, mock_sleep):
+        _, client = self.serve(reports=10)
+        pages = [errors.InternalServerError("Unavailable"), iter([([], None)])]
+        with patch.object(client, "_iter_pages", side_effect=pages), patch(
+            "sys.stderr", new_callable=io.StringIO
+        ) as stderr:
+            client.watch(after=10, max_polls=2)
+        stats = json.loads(stderr.getvalue().splitlines()[-1])
+        self.assertEqual(stats["failed_polls"], 1)
+        self.assertEqual(stats["last_id"], 10)
+        self.assertIn("Poll 1 failed: InternalServerError", stderr.getvalue())
+        with self.assertRaises(ValueError):
+            client.watch(jitter=1)
+
+    def test_watch_timeout(self):
+        """Ensure a poll the API never answers fails instead of hanging the watch."""
+        server, _ = self.serve(reports=10, latency=5)
+        client = pdm.PostDmarc(
+            api_key=API_KEY, endpoint=server.url, max_attempts=1, timeout=0.2
+        )
+
+        def recover(event):
+            # The API answers again by the next poll
+            if isinstance(event.error, pdm.requests.Timeout):
+                server.api.config = server.api.config._replace(latency=0)
+
+        client.add_hook("response", recover)
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            stats = client.watch(
+                interval=0.01, jitter=0, store_path=":memory:", after=5, max_polls=2
+            )
+        self.assertEqual(stats["failed_polls"], 1)
+        self.assertEqual(stats["last_id"], 10)
+        self.assertIn("Poll 1 failed: ReadTimeout", stderr.getvalue())
+
+    def test_xml_records(self):
+        _, client = self.serve(records_per_report=5)
+        records = list(client.iter_report_records(7))
+        report = client.get_report(7).json
+        self.assertEqual(
+            [record["source_ip"] for record in records],
+            [record["source_ip"] for record in report["records"]],
+        )
+
+    def test_not_modified(self):
+        _, client = self.serve()
+        client.get_dns_snippet()
+        client.get_dns_snippet()
+        statuses = client.request_metrics()["GET /records/my/dns"]["statuses"]
+        self.assertEqual(statuses, {200: 1, 304: 1})
+
+    def test_invalid_key(self):
+        server, _ = self.serve()
+        with self.assertRaises(errors.APIKeyInvalidError):
+            pdm.PostDmarc(api_key="wrong", endpoint=server.url).get_record()
+
+    @patch.object(pdm.time, "sleep")
+    def test_error_injection(self, mock_sleep):
+        _, client = self.serve(error_rate=1.0, error_status=503)
+        with self.assertRaises(errors.UnrecognizedStatusCodeError):
+            client.get_report(1)
+        self.assertEqual(
+            client.request_metrics()["GET /records/my/reports/{id}"]["retries"], 2
+        )
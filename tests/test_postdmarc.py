@@ -1,9 +1,37 @@
+import json
 import os
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
-from unittest.mock import patch
+from datetime import datetime
+from unittest.mock import Mock, patch
 
 import postdmarc.pdm_exceptions as errors
 import postdmarc.postdmarc as pdm
+from tests.helpers import fake_response
+
+
+def fake_get(pages, key="after", hook=None):
+    """Build a stand-in for Session.get, serving `pages` of the report listing.
+
+    Listing pages are looked up by the `key` parameter of the request, and report
+    requests are answered with the ID of the report alone. `hook`, if given, is
+    called with the URL and parameters of every request first, and its response is
+    returned instead if it gives one.
+    """
+
+    def get(url, params=None, timeout=None):
+        if hook is not None:
+            response = hook(url, params)
+            if response is not None:
+                return response
+        if url.endswith("/reports"):
+            return fake_response(200, pages[params.get(key)])
+        return fake_response(200, {"id": int(url.rsplit("/", 1)[1])})
+
+    return get
 
 
 class TestResponse(unittest.TestCase):
@@ -15,11 +43,11 @@ class TestResponse(unittest.TestCase):
     @patch.object(pdm.requests.Session, "post")
     def test_status_code_500(self, mock_post):
         """Test that an exception is raised on internal server error."""
-        mock_post.return_value.status_code = 500
-        mock_post.return_value.json.return_value = {
+        body = {
             "message": "Failed to create a subscription "
             "for the specified email address."
         }
+        mock_post.return_value = fake_response(500, body)
         self.assertRaises(
             errors.InternalServerError,
             self.connection.create_record,
@@ -27,10 +55,68 @@ class TestResponse(unittest.TestCase):
             "postmarkapp.com",
         )
 
+    @patch.object(pdm.time, "sleep")
+    @patch.object(pdm.requests.Session, "get")
+    def test_retry(self, mock_get, mock_sleep):
+        """Ensure transient failures are retried, honoring Retry-After."""
+        throttled = fake_response(
+            429, {"message": "Too many requests"}, {"Retry-After": "2"}
+        )
+        throttled.close = Mock()
+        ok = fake_response(200, {"domain": "postmarkapp.com"})
+        mock_get.side_effect = [pdm.requests.ConnectionError(), throttled, ok]
+
+        response = self.connection.get_record()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_args.args, (2.0,))
+
+        mock_get.reset_mock()
+        mock_get.side_effect = [pdm.requests.ReadTimeout(), ok]
+        self.assertEqual(self.connection.get_record().status_code, 200)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get.side_effect = [pdm.requests.Timeout()] * 3
+        self.assertRaises(pdm.requests.Timeout, self.connection.get_record)
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], self.connection.timeout)
+
+        mock_get.side_effect = [throttled] * 3
+        self.assertRaises(errors.TooManyRequestsError, self.connection.get_record)
+        # Responses are closed before retrying, releasing their connection
+        self.assertEqual(throttled.close.call_count, 3)
+
+    @patch.object(pdm.time, "sleep")
+    @patch.object(pdm.requests.Session, "get")
+    def test_retry_after_too_long(self, mock_get, mock_sleep):
+        """Ensure a Retry-After beyond the cap fails instead of stalling."""
+        throttled = fake_response(
+            429, {"message": "Too many requests"}, {"Retry-After": "86400"}
+        )
+        mock_get.return_value = throttled
+        self.assertRaises(errors.TooManyRequestsError, self.connection.get_record)
+        self.assertEqual(mock_get.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    @patch.object(pdm.time, "sleep")
+    @patch.object(pdm.requests.Session, "get")
+    def test_rate_limit(self, mock_get, mock_sleep):
+        """Ensure requests beyond the rate limit wait for the token bucket."""
+        mock_get.return_value = fake_response(200, {})
+        connection = pdm.PostDmarc(rate_limit=1)
+        connection._rate_limiter.sleep = mock_sleep
+        connection.get_record()
+        self.assertFalse(mock_sleep.called)
+        connection.get_record()
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 1.0, places=2)
+
+    def test_unrecognized_status_code(self):
+        response = fake_response(418, {"message": "I'm a teapot"})
+        self.assertRaises(
+            errors.UnrecognizedStatusCodeError, self.connection.check_response, response
+        )
+
     @patch.object(pdm.requests.Session, "post")
     def test_create_record(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {
+        body = {
             "domain": "postmarkapp.com",
             "public_token": "1mVgKNr5scA",
             "created_at": "2014-06-25T19:22:53Z",
@@ -38,6 +124,7 @@ class TestResponse(unittest.TestCase):
             "reporting_uri": "mailto:randomhash+1mSgANr7scM@inbound.postmarkapp.com",
             "email": "tema@wildbit.com",
         }
+        mock_post.return_value = fake_response(200, body)
         response = self.connection.create_record("tema@wildbit.com", "postmarkapp.com")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
@@ -54,8 +141,7 @@ class TestResponse(unittest.TestCase):
 
     @patch.object(pdm.requests.Session, "get")
     def test_get_record(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {
+        body = {
             "domain": "postmarkapp.com",
             "public_token": "1mVgKNr5scA",
             "created_at": "2014-06-25T19:22:53Z",
@@ -63,8 +149,10 @@ class TestResponse(unittest.TestCase):
             "reporting_uri": "mailto:randomhash+1mSgANr7scM@inbound.postmarkapp.com",
             "email": "tema@wildbit.com",
         }
+        mock_get.return_value = fake_response(200, body)
         response = self.connection.get_record()
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], pdm.DEFAULT_TIMEOUT)
         self.assertEqual(
             set(response.json.keys()),
             {
@@ -79,14 +167,14 @@ class TestResponse(unittest.TestCase):
 
     @patch.object(pdm.requests.Session, "patch")
     def test_update_record(self, mock_patch):
-        mock_patch.return_value.status_code = 200
-        mock_patch.return_value.json.return_value = {
+        body = {
             "domain": "postmarkapp.com",
             "public_token": "1mVgKNr5scA",
             "created_at": "2014-06-25T19:22:53Z",
             "reporting_uri": "mailto:randomhash+1mSgANr7scM@inbound.postmarkapp.com",
             "email": "tema@wildbit.com",
         }
+        mock_patch.return_value = fake_response(200, body)
 
         response = self.connection.update_record("tema@wildbit.com")
         self.assertEqual(response.status_code, 200)
@@ -97,13 +185,13 @@ class TestResponse(unittest.TestCase):
 
     @patch.object(pdm.requests.Session, "get")
     def test_get_dns_snippet(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {
+        body = {
             "value": r"\"v=DMARC1; p=none; pct=100; "
             r"rua=mailto:randomhash+1mSgKNr7scM@inbound.postmarkapp.com; "
             r"sp=none; aspf=r;\"",
             "name": "_dmarc.wildbit.com.",
         }
+        mock_get.return_value = fake_response(200, body)
         response = self.connection.get_dns_snippet()
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
@@ -112,24 +200,21 @@ class TestResponse(unittest.TestCase):
 
     @patch.object(pdm.requests.Session, "post")
     def test_verify_dns(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"verified": "false"}
+        mock_post.return_value = fake_response(200, {"verified": "false"})
         response = self.connection.verify_dns()
         self.assertEqual(response.status_code, 200)
         self.assertEqual(set(response.json.keys()), {"verified"})
 
     @patch.object(pdm.requests.Session, "delete")
     def test_delete_record(self, mock_delete):
-        mock_delete.return_value.status_code = 204
-        mock_delete.return_value.json.return_value = {}
+        mock_delete.return_value = fake_response(204, {})
         response = self.connection.delete_record()
         self.assertEqual(response.status_code, 204)
         self.assertEqual(set(response.json.keys()), set())
 
     @patch.object(pdm.requests.Session, "get")
     def test_list_reports(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {
+        body = {
             "meta": {
                 "next": 276,
                 "next_url": "/records/my/reports?from_date=&to_date=&limit=1&after=276",
@@ -147,6 +232,7 @@ class TestResponse(unittest.TestCase):
                 }
             ],
         }
+        mock_get.return_value = fake_response(200, body)
         response = self.connection.list_reports(
             from_date="2014-05-17", to_date="2014-06-17", limit=100, after=4
         )
@@ -167,8 +253,7 @@ class TestResponse(unittest.TestCase):
 
     @patch.object(pdm.requests.Session, "get")
     def test_get_report(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {
+        body = {
             "id": 276,
             "domain": "wildbit.com",
             "date_range_begin": "2014-04-27T20:00:00Z",
@@ -198,6 +283,7 @@ class TestResponse(unittest.TestCase):
                 }
             ],
         }
+        mock_get.return_value = fake_response(200, body)
         response = self.connection.get_report(276)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
@@ -235,20 +321,293 @@ class TestResponse(unittest.TestCase):
             },
         )
 
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_reports(self, mock_get):
+        """Ensure pages are only requested as the entries are consumed."""
+        first = fake_response(200, {"meta": {"next": 2}, "entries": [{"id": 1}]})
+        second = fake_response(200, {"meta": {"next": None}, "entries": [{"id": 2}]})
+        mock_get.side_effect = [first, second]
+
+        entries = self.connection.iter_reports("2020-01-01", "2020-01-08")
+        self.assertEqual(next(entries), {"id": 1})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(list(entries), [{"id": 2}])
+        self.assertEqual(mock_get.call_args.kwargs["params"]["after"], 2)
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_report_details(self, mock_get):
+        pages = {None: {"meta": {"next": None}, "entries": [{"id": 1}, {"id": 2}]}}
+        mock_get.side_effect = fake_get(pages)
+        reports = list(self.connection.iter_report_details(concurrency=2))
+        self.assertEqual(reports, [(200, {"id": 1}), (200, {"id": 2})])
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_report_details_prefetch(self, mock_get):
+        """Ensure the next listing page is requested while reports download."""
+        pages = {
+            None: {"meta": {"next": 1}, "entries": [{"id": 1}]},
+            1: {"meta": {"next": None}, "entries": [{"id": 2}]},
+        }
+        second_page_requested = threading.Event()
+
+        def hook(url, params):
+            if url.endswith("/reports") and params.get("after") == 1:
+                second_page_requested.set()
+            elif url.endswith("/reports/1"):
+                # Only returns once the listing has moved on to the second page
+                self.assertTrue(second_page_requested.wait(timeout=5))
+
+        mock_get.side_effect = fake_get(pages, hook=hook)
+        reports = list(self.connection.iter_report_details(prefetch_pages=1))
+        self.assertEqual(reports, [(200, {"id": 1}), (200, {"id": 2})])
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_report_details_sharded(self, mock_get):
+        """Ensure windows are merged in date order, without duplicate reports."""
+        # A report received around midnight may show up in two neighbouring windows
+        windows = {
+            "2020-01-01": {"meta": {"next": None}, "entries": [{"id": 1}, {"id": 2}]},
+            "2020-01-02": {"meta": {"next": None}, "entries": [{"id": 2}, {"id": 3}]},
+            "2020-01-03": {"meta": {"next": None}, "entries": []},
+            "2020-01-04": {"meta": {"next": None}, "entries": [{"id": 4}]},
+        }
+        mock_get.side_effect = fake_get(windows, key="from_date")
+        reports = self.connection.iter_report_details(
+            "2020-01-01", "2020-01-05", concurrency=3, shard_days=1
+        )
+        self.assertEqual([report.json["id"] for report in reports], [1, 2, 3, 4])
+
+        with self.assertRaises(ValueError):
+            list(self.connection.iter_report_details("2020-01-01", shard_days=1))
+
+    def test_prefetch_errors(self):
+        """Ensure exceptions raised while prefetching reach the consumer."""
+
+        def failing():
+            yield 1
+            raise errors.InternalServerError("Server error")
+
+        items = pdm.prefetch(failing(), 2)
+        self.assertEqual(next(items), 1)
+        self.assertRaises(errors.InternalServerError, next, items)
+        self.assertEqual(list(pdm.prefetch(range(5), 0)), [0, 1, 2, 3, 4])
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_export_all_reports_concurrent(self, mock_get):
+        """Ensure parallel downloads are written out in report ID order."""
+        pages = {
+            None: {"meta": {"next": 3}, "entries": [{"id": 1}, {"id": 2}, {"id": 3}]},
+            3: {"meta": {"next": None}, "entries": [{"id": 4}, {"id": 5}]},
+        }
+
+        mock_get.side_effect = fake_get(pages)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.json")
+            self.connection.export_all_reports(
+                "2020-01-01", "2020-01-08", filepath, concurrency=4
+            )
+            with open(filepath) as f:
+                output = json.load(f)
+        self.assertEqual([report[1]["id"] for report in output], [1, 2, 3, 4, 5])
+        self.assertRaises(
+            ValueError,
+            self.connection.export_all_reports,
+            "2020-01-01",
+            "2020-01-08",
+            "reports.json",
+            concurrency=0,
+        )
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_export_all_reports_jsonl(self, mock_get):
+        """Ensure each report is streamed to its own line."""
+        listing = fake_response(
+            200,
+            {
+                "meta": {"next": None},
+                "entries": [{"id": 1}, {"id": 2}],
+            },
+        )
+        report = fake_response(200, {"id": 1})
+        mock_get.side_effect = [listing, report, report]
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.jsonl")
+            self.connection.export_all_reports(
+                "2020-01-01", "2020-01-08", filepath, output_format="jsonl"
+            )
+            with open(filepath) as f:
+                lines = f.readlines()
+        self.assertEqual([json.loads(line) for line in lines], [[200, {"id": 1}]] * 2)
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_export_all_reports_csv(self, mock_get):
+        """Ensure records are flattened to one CSV row each."""
+        listing = fake_response(200, {"meta": {"next": None}, "entries": [{"id": 1}]})
+        report = fake_response(
+            200,
+            {
+                "id": 1,
+                "records": [{"source_ip": "127.0.0.1"}, {"source_ip": "10.0.0.1"}],
+            },
+        )
+        mock_get.side_effect = [listing, report]
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "records.csv")
+            self.connection.export_all_reports(
+                "2020-01-01", "2020-01-08", filepath, output_format="csv"
+            )
+            with open(filepath) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("report_id,"))
+        self.assertIn("127.0.0.1", lines[1])
+        self.assertRaises(
+            ValueError,
+            self.connection.export_all_reports,
+            "2020-01-01",
+            "2020-01-08",
+            "records.npz",
+            output_format="npz",
+            resume=True,
+        )
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_export_all_reports_resume(self, mock_get):
+        """Ensure an interrupted export resumes from its checkpoint."""
+        pages = {
+            None: {"meta": {"next": 3}, "entries": [{"id": 1}, {"id": 2}, {"id": 3}]},
+            3: {"meta": {"next": None}, "entries": [{"id": 4}, {"id": 5}]},
+        }
+        requested = []
+
+        def hook(url, params):
+            if url.endswith("/reports"):
+                return None
+            requested.append(int(url.rsplit("/", 1)[1]))
+            if requested[-1] == 5 and requested.count(5) == 1:
+                return fake_response(500, {"message": "Server error"})
+            return None
+
+        mock_get.side_effect = fake_get(pages, hook=hook)
+        connection = pdm.PostDmarc(max_attempts=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.json")
+            self.assertRaises(
+                errors.InternalServerError,
+                connection.export_all_reports,
+                "2020-01-01",
+                "2020-01-08",
+                filepath,
+            )
+            self.assertTrue(os.path.exists(f"{filepath}.checkpoint"))
+
+            connection.export_all_reports(
+                "2020-01-01", "2020-01-08", filepath, resume=True
+            )
+            with open(filepath) as f:
+                output = json.load(f)
+            self.assertFalse(os.path.exists(f"{filepath}.checkpoint"))
+        self.assertEqual([report[1]["id"] for report in output], [1, 2, 3, 4, 5])
+        self.assertEqual(requested, [1, 2, 3, 4, 5, 4, 5])
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_get_report_cached(self, mock_get):
+        """Ensure a cached report is only downloaded once."""
+        mock_get.return_value = fake_response(200, {"id": 276, "records": []})
+        with tempfile.TemporaryDirectory() as tmp:
+            connection = pdm.PostDmarc(cache_path=os.path.join(tmp, "cache.db"))
+            first = connection.get_report(276)
+            second = connection.get_report(276)
+            stats = connection.cache_stats()
+            connection._cache.close()
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_sync(self, mock_get):
+        """Ensure each sync only lists reports newer than the last one stored."""
+        pages = {
+            None: {"meta": {"next": None}, "entries": [{"id": 1}, {"id": 2}]},
+            2: {"meta": {"next": None}, "entries": [{"id": 3}]},
+            3: {"meta": {"next": None}, "entries": []},
+        }
+
+        mock_get.side_effect = fake_get(pages)
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "store.db")
+            first = self.connection.sync(store_path)
+            pages[None]["entries"].append({"id": 3})
+            second = self.connection.sync(store_path)
+            third = self.connection.sync(store_path)
+        self.assertEqual(first, {"new_reports": 2, "last_id": 2})
+        self.assertEqual(second, {"new_reports": 1, "last_id": 3})
+        self.assertEqual(third, {"new_reports": 0, "last_id": 3})
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_summarize(self, mock_get):
+        listing = fake_response(200, {"meta": {"next": None}, "entries": [{"id": 1}]})
+        report = fake_response(
+            200,
+            {
+                "id": 1,
+                "records": [
+                    {
+                        "source_ip": "127.0.0.1",
+                        "count": 3,
+                        "policy_evaluated_spf": "pass",
+                    }
+                ],
+            },
+        )
+        mock_get.side_effect = [listing, report]
+        result = self.connection.summarize("2020-01-01", "2020-01-08")
+        self.assertEqual(result["reports"], 1)
+        self.assertEqual(result["by_source_ip"]["127.0.0.1"]["spf_aligned"], 3)
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_query(self, mock_get):
+        """Ensure exported reports can be queried from the local store."""
+        listing = fake_response(200, {"meta": {"next": None}, "entries": [{"id": 1}]})
+        report = fake_response(
+            200,
+            {
+                "id": 1,
+                "date_range_begin": "2020-01-02T00:00:00Z",
+                "records": [{"source_ip": "127.0.0.1"}, {"source_ip": "10.0.0.1"}],
+            },
+        )
+        mock_get.side_effect = [listing, report]
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "store.db")
+            self.connection.export_all_reports(
+                "2020-01-01",
+                "2020-01-08",
+                os.path.join(tmp, "reports.json"),
+                store_path=store_path,
+            )
+            rows = self.connection.query(
+                store_path, source_ip="10.0.0.1", from_date="2020-01-01"
+            )
+            self.assertEqual(
+                self.connection.query(store_path, to_date="2020-01-01"), []
+            )
+        self.assertEqual(
+            [(row["report_id"], row["source_ip"]) for row in rows], [(1, "10.0.0.1")]
+        )
+
     @patch.object(pdm.requests.Session, "post")
     def test_recover_token(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {"recovery_initiated": True}
+        mock_post.return_value = fake_response(200, {"recovery_initiated": True})
         response = self.connection.recover_token("wildbit.com")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(set(response.json.keys()), {"recovery_initiated"})
 
     @patch.object(pdm.requests.Session, "post")
     def test_rotate_token(self, mock_post):
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = {
-            "private_token": "115d8431-b020-41aa-230e-4d63a0357869"
-        }
+        mock_post.return_value = fake_response(
+            200, {"private_token": "115d8431-b020-41aa-230e-4d63a0357869"}
+        )
         response = self.connection.rotate_token()
         self.assertEqual(response.status_code, 200)
         self.assertEqual(set(response.json.keys()), {"private_token"})
@@ -303,3 +662,357 @@ class TestAPIKey(unittest.TestCase):
     def test_api_key_not_found(self):
         """Ensure that a missing API key raises an error."""
         self.assertRaises(errors.APIKeyMissingError, pdm.PostDmarc)
+
+
+class TestFormatDate(unittest.TestCase):
+    """Test that dates are converted to the format required by PostMark."""
+
+    def test_iso_dates(self):
+        self.assertEqual(pdm.format_date("2020-01-05"), "2020-01-05")
+        self.assertEqual(pdm.format_date("2020/1/5"), "2020-01-05")
+        self.assertEqual(pdm.format_date("2020-01-05T13:45:00Z"), "2020-01-05")
+        self.assertEqual(pdm.format_date(" 2020-01-05 13:45 "), "2020-01-05")
+        self.assertEqual(pdm.format_date(datetime(2020, 1, 5, 13)), "2020-01-05")
+        self.assertIsNone(pdm.format_date(None))
+
+    def test_invalid_iso_date(self):
+        with self.assertRaises(ValueError):
+            pdm.format_date("2020-02-30")
+
+    @patch("dateparser.parse")
+    def test_iso_dates_skip_dateparser(self, mock_parse):
+        pdm.format_date("2021-03-04")
+        mock_parse.assert_not_called()
+
+    def test_iso_dates_are_memoized(self):
+        pdm.format_iso_date.cache_clear()
+        pdm.format_date("2020-01-05")
+        pdm.format_date("2020-01-05")
+        self.assertEqual(pdm.format_iso_date.cache_info().hits, 1)
+
+    def test_natural_dates(self):
+        self.assertEqual(pdm.format_date("5 January 2020"), "2020-01-05")
+        with self.assertRaises(ValueError):
+            pdm.format_date("not a date")
+
+    @patch("dateparser.parse")
+    def test_natural_dates_are_not_memoized(self, mock_parse):
+        """Relative dates such as "yesterday" change from one day to the next."""
+        mock_parse.side_effect = [datetime(2020, 1, 4), datetime(2020, 1, 5)]
+        self.assertEqual(pdm.format_date("yesterday"), "2020-01-04")
+        self.assertEqual(pdm.format_date("yesterday"), "2020-01-05")
+
+
+class TestStartup(unittest.TestCase):
+    """Guard the import time of the command line entry points.
+
+    See benchmarks/startup.py for timings.
+    """
+
+    def imported_modules(self, code):
+        """Return the top level modules imported by running `code`."""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+            [sys.executable, "-c", f"{code}; import sys; print(*sys.modules)"],
+            env=dict(os.environ, PYTHONPATH=root),
+        )
+        return set(output.decode().split())
+
+    def test_import_is_lazy(self):
+        for module in ("postdmarc.postdmarc", "postdmarc.fleet"):
+            with self.subTest(module=module):
+                imported = self.imported_modules(f"import {module}")
+                for heavy in ("fire", "requests", "dateparser", "sqlite3"):
+                    self.assertNotIn(heavy, imported)
+
+    def test_offline_command_skips_requests(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, "reports.db")
+            imported = self.imported_modules(
+                "import postdmarc.postdmarc as pdm; "
+                f"pdm.PostDmarc(api_key='test').query({store_path!r}, "
+                "from_date='2020-01-01')"
+            )
+        self.assertIn("sqlite3", imported)
+        self.assertNotIn("requests", imported)
+        self.assertNotIn("dateparser", imported)
+
+    def test_requests_attribute(self):
+        """The requests module is still reachable as an attribute, for patching."""
+        import requests
+
+        self.assertIs(pdm.requests, requests)
+
+
+class TestXmlReports(unittest.TestCase):
+    """Test the retrieval of raw DMARC XML reports."""
+
+    def setUp(self):
+        self.connection = pdm.PostDmarc(api_key="test")
+        self.document = b"<feedback><record><row><count>2</count></row></record>"
+        self.document += b"</feedback>"
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_get_report_xml(self, mock_get):
+        # The document isn't JSON, so decoding it as JSON would fail
+        mock_get.return_value = fake_response(200, content=self.document)
+        response = self.connection.get_report(276, fmt="xml")
+        self.assertEqual(response, (200, self.document.decode()))
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"], {"Accept": "application/xml"}
+        )
+
+    @patch.object(pdm.requests.Response, "close", autospec=True)
+    @patch.object(pdm.requests.Session, "get")
+    def test_download_report(self, mock_get, mock_close):
+        mock_get.return_value = fake_response(200, content=self.document)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "report.xml")
+            size = self.connection.download_report(276, filepath)
+            with open(filepath, "rb") as f:
+                self.assertEqual(f.read(), self.document)
+            self.assertEqual(os.listdir(tmp), ["report.xml"])
+        self.assertEqual(size, len(self.document))
+        self.assertTrue(mock_get.call_args.kwargs["stream"])
+        mock_close.assert_called_once_with(mock_get.return_value)
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_download_report_error(self, mock_get):
+        mock_get.return_value = fake_response(200, content=self.document)
+        mock_get.return_value.raw.read = Mock(side_effect=pdm.requests.ConnectionError)
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "report.xml")
+            with self.assertRaises(pdm.requests.ConnectionError):
+                self.connection.download_report(276, filepath)
+            self.assertEqual(os.listdir(tmp), [])
+
+    @patch.object(pdm.requests.Response, "close", autospec=True)
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_report_records(self, mock_get, mock_close):
+        mock_get.return_value = fake_response(200, content=self.document)
+        records = list(self.connection.iter_report_records(276))
+        self.assertEqual([record["count"] for record in records], [2])
+        mock_close.assert_called_once_with(mock_get.return_value)
+
+    @patch.object(pdm.requests.Response, "close", autospec=True)
+    @patch.object(pdm.requests.Session, "get")
+    def test_iter_report_records_not_found(self, mock_get, mock_close):
+        mock_get.return_value = fake_response(404, {"message": "Not found"})
+        with self.assertRaises(errors.PageNotFoundError):
+            list(self.connection.iter_report_records(276))
+        mock_close.assert_called_once_with(mock_get.return_value)
+
+
+class TestConditionalRequests(unittest.TestCase):
+    """Test that the record and DNS snippet are revalidated instead of resent."""
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_not_modified(self, mock_get):
+        connection = pdm.PostDmarc(api_key="test")
+        mock_get.side_effect = [
+            fake_response(200, {"domain": "wildbit.com"}, {"ETag": '"1"'}),
+            fake_response(304),
+        ]
+        first = connection.get_record()
+        second = connection.get_record()
+        self.assertEqual(first, second)
+        self.assertEqual(second.json, {"domain": "wildbit.com"})
+        self.assertEqual(mock_get.call_args_list[0].kwargs["headers"], {})
+        self.assertEqual(
+            mock_get.call_args_list[1].kwargs["headers"], {"If-None-Match": '"1"'}
+        )
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_modified(self, mock_get):
+        connection = pdm.PostDmarc(api_key="test")
+        mock_get.side_effect = [
+            fake_response(200, {"name": "old"}, {"ETag": '"1"'}),
+            fake_response(200, {"name": "new"}, {"ETag": '"2"'}),
+        ]
+        connection.get_dns_snippet()
+        self.assertEqual(connection.get_dns_snippet().json, {"name": "new"})
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_cached_responses_are_copies(self, mock_get):
+        """Ensure changing a returned record doesn't change the cached one."""
+        connection = pdm.PostDmarc(api_key="test", response_ttl=60)
+        mock_get.side_effect = [
+            fake_response(200, {"domain": "wildbit.com"}, {"ETag": '"1"'}),
+            fake_response(304),
+        ]
+        connection.get_record().json["domain"] = "changed.com"
+        fresh = connection.get_record()
+        fresh.json["domain"] = "changed.com"
+        connection._responses.ttl = 0
+        revalidated = connection.get_record()
+        self.assertEqual(revalidated.json, {"domain": "wildbit.com"})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch.object(pdm.requests.Session, "get")
+    def test_response_ttl(self, mock_get):
+        connection = pdm.PostDmarc(api_key="test", response_ttl=60)
+        mock_get.return_value = fake_response(200, {"domain": "wildbit.com"})
+        connection.get_record()
+        connection.get_record()
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch.object(pdm.requests.Session, "patch")
+    @patch.object(pdm.requests.Session, "get")
+    def test_changes_invalidate(self, mock_get, mock_patch):
+        connection = pdm.PostDmarc(api_key="test", response_ttl=60)
+        mock_get.return_value = fake_response(200, {"email": "old@wildbit.com"})
+        mock_patch.return_value = fake_response(200, {"email": "new@wildbit.com"})
+        connection.get_record()
+        connection.update_record("new@wildbit.com")
+        connection.get_record()
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_accepts_compressed_responses(self):
+        connection = pdm.PostDmarc(api_key="test")
+        self.assertIn("gzip", connection.session.headers["Accept-Encoding"])
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test the request hooks and the metrics collected through them."""
+
+    @patch.object(pdm.time, "sleep")
+    @patch.object(pdm.requests.Session, "get")
+    def test_hooks(self, mock_get, mock_sleep):
+        connection = pdm.PostDmarc(api_key="test")
+        requests_sent, events = [], []
+        connection.add_hook("request", lambda *args: requests_sent.append(args))
+        connection.add_hook("response", events.append)
+        unavailable = fake_response(503)
+        ok = fake_response(200, {"id": 276}, {"Content-Length": "17"})
+        mock_get.side_effect = [pdm.requests.ConnectionError("reset"), unavailable, ok]
+
+        connection.get_report(276)
+
+        endpoint = "/records/my/reports/{id}"
+        self.assertEqual(
+            requests_sent,
+            [("get", endpoint, 1), ("get", endpoint, 2), ("get", endpoint, 3)],
+        )
+        self.assertEqual([event.status_code for event in events], [None, 503, 200])
+        self.assertIsInstance(events[0].error, pdm.requests.ConnectionError)
+        self.assertEqual(events[2].bytes_received, 17)
+
+        metrics = connection.request_metrics()[f"GET {endpoint}"]
+        self.assertEqual(metrics["requests"], 3)
+        self.assertEqual(metrics["retries"], 2)
+        self.assertEqual(metrics["errors"], 1)
+        self.assertIn(
+            "postdmarc_retries_total", connection.request_metrics("prometheus")
+        )
+
+    def test_unknown_hook(self):
+        connection = pdm.PostDmarc(api_key="test")
+        with self.assertRaises(ValueError):
+            connection.add_hook("retry", print)
+        with self.assertRaises(ValueError):
+            connection.request_metrics("csv")
+        with self.assertRaises(ValueError):
+            pdm.PostDmarc(api_key="test", metrics="csv")
+
+    @patch.object(pdm.atexit, "register")
+    @patch.object(pdm.requests.Session, "get")
+    def test_report_metrics_at_exit(self, mock_get, mock_register):
+        mock_get.return_value = fake_response(200, {})
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics_path = os.path.join(tmp, "postdmarc.prom")
+            connection = pdm.PostDmarc(
+                api_key="test", metrics="prometheus", metrics_path=metrics_path
+            )
+            connection.get_record()
+            report, *args = mock_register.call_args.args
+            report(*args)
+            with open(metrics_path) as f:
+                text = f.read()
+        labels = 'method="GET",endpoint="/records/my",status="200"'
+        self.assertIn(f"postdmarc_requests_total{{{labels}}} 1", text)
+
+
+class TestThreadSafety(unittest.TestCase):
+    """Ensure one client can be shared by many threads."""
+
+    def setUp(self):
+        self.sent = []
+        self.sent_lock = threading.Lock()
+
+    def fake_send(self, adapter, request, **kwargs):
+        """Record the headers of a prepared request, as they would go on the wire."""
+        with self.sent_lock:
+            self.sent.append((request.method, request.path_url, request.headers))
+        response = pdm.requests.Response()
+        response.status_code = 200
+        response.request = request
+        response.url = request.url
+        if request.headers["Accept"] == "application/xml":
+            response._content = b"<feedback/>"
+        else:
+            response._content = b"{}"
+        return response
+
+    def test_concurrent_requests_keep_their_headers(self):
+        connection = pdm.PostDmarc(api_key="test", pool_size=16)
+        calls = [
+            lambda: connection.create_record("tema@wildbit.com", "postmarkapp.com"),
+            lambda: connection.get_record(),
+            lambda: connection.update_record("tema@wildbit.com"),
+            lambda: connection.get_report(1),
+            lambda: connection.get_report(2, fmt="xml"),
+            lambda: connection.recover_token("tema@wildbit.com"),
+            lambda: connection.rotate_token(),
+        ]
+        barrier = threading.Barrier(16)
+        errors_raised = []
+
+        def work(offset):
+            barrier.wait()
+            try:
+                for index in range(70):
+                    calls[(index + offset) % len(calls)]()
+            except Exception as error:
+                errors_raised.append(error)
+
+        with patch.object(
+            pdm.requests.adapters.HTTPAdapter, "send", autospec=True
+        ) as mock_send:
+            mock_send.side_effect = self.fake_send
+            threads = [threading.Thread(target=work, args=(i,)) for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors_raised, [])
+        self.assertEqual(len(self.sent), 16 * 70)
+        public = {"/records", "/tokens/recover"}
+        for method, path, headers in self.sent:
+            with self.subTest(method=method, path=path):
+                if path in public:
+                    self.assertNotIn("X-Api-Token", headers)
+                else:
+                    self.assertEqual(headers["X-Api-Token"], "test")
+                if path == "/records/my/reports/2":
+                    self.assertEqual(headers["Accept"], "application/xml")
+                else:
+                    self.assertEqual(headers["Accept"], "application/json")
+                if method in ("POST", "PATCH") and path != "/records/my/token/rotate":
+                    self.assertEqual(headers["Content-Type"], "application/json")
+                else:
+                    self.assertNotIn("Content-Type", headers)
+        self.assertEqual(connection.session.headers["X-Api-Token"], "test")
+        self.assertNotIn("Content-Type", connection.session.headers)
+
+    def test_pool_size(self):
+        connection = pdm.PostDmarc(api_key="test", pool_size=32)
+        adapter = connection.session.get_adapter(pdm.API_ENDPOINT + "/records/my")
+        self.assertEqual(adapter._pool_maxsize, 32)
+        connection._size_connection_pool(8)
+        self.assertIs(
+            connection.session.get_adapter(pdm.API_ENDPOINT + "/records"), adapter
+        )
+        connection._size_connection_pool(64)
+        adapter = connection.session.get_adapter(pdm.API_ENDPOINT + "/records/my")
+        self.assertEqual(adapter._pool_maxsize, 64)
@@ -0,0 +1,70 @@
+import copy
+import json
+import tracemalloc
+import unittest
+
+from postdmarc.mock_server import MockConfig, MockDmarcApi
+from postdmarc.report_model import Report, ReportRecord
+
+
+class TestReportModel(unittest.TestCase):
+    """Test the compact report model."""
+
+    def setUp(self):
+        self.api = MockDmarcApi(MockConfig(records_per_report=20))
+        self.data = json.loads(self.api.render_report(7, False))
+
+    def test_fields(self):
+        report = Report(self.data)
+        self.assertEqual(report.id, 7)
+        self.assertEqual(report.organization_name, self.data["organization_name"])
+        self.assertIsNone(report.extra)
+        self.assertFalse(hasattr(report, "__dict__"))
+
+        record = report.records[0]
+        self.assertIsInstance(record, ReportRecord)
+        self.assertEqual(record.source_ip, self.data["records"][0]["source_ip"])
+        self.assertEqual(record.count, self.data["records"][0]["count"])
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_records_decoded_lazily(self):
+        report = Report(self.data)
+        self.assertIsNone(report._records)
+        self.assertIs(report.to_dict()["records"], self.data["records"])
+        records = report.records
+        self.assertIs(report.records, records)
+        self.assertIsNone(report._raw_records)
+        self.assertEqual(len(records), 20)
+
+    def test_round_trip(self):
+        data = {**self.data, "extra_contact_info": "dmarc@example.com"}
+        report = Report(copy.deepcopy(data))
+        self.assertEqual(report.to_dict(), data)
+        report.records
+        self.assertEqual(report.to_dict(), data)
+        self.assertEqual(report.extra, {"extra_contact_info": "dmarc@example.com"})
+        self.assertEqual(copy.deepcopy(report), report)
+
+    def test_missing_fields(self):
+        report = Report({"id": 1})
+        self.assertIsNone(report.domain)
+        self.assertEqual(report.records, ())
+
+    def test_memory(self):
+        """Ensure decoded reports take much less memory than the dictionaries."""
+        bodies = [self.api.render_report(id, False) for id in range(1, 51)]
+
+        tracemalloc.start()
+        try:
+            dicts = [json.loads(body) for body in bodies]
+            dict_size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            reports = [Report(json.loads(body)) for body in bodies]
+            for report in reports:
+                report.records
+            model_size = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(dicts), len(reports))
+        self.assertLess(model_size, dict_size * 0.6)
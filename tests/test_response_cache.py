@@ -0,0 +1,75 @@
+import unittest
+
+from postdmarc.response_cache import ResponseCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test the freshness and revalidation of cached responses."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttl=10, max_entries=2, clock=self.clock)
+
+    def test_fresh_then_stale(self):
+        body = b'{"domain": "wildbit.com"}'
+        self.cache.put("/records/my", 200, body, {"ETag": '"1"'})
+        entry = self.cache.get("/records/my")
+        self.assertEqual(entry.body, body)
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.clock.now = 10
+        self.assertFalse(self.cache.is_fresh(entry))
+
+    def test_validators(self):
+        self.cache.put(
+            "/records/my",
+            200,
+            b"{}",
+            {"ETag": '"1"', "Last-Modified": "Sat, 01 Feb 2020 00:00:00 GMT"},
+        )
+        self.assertEqual(
+            self.cache.validators(self.cache.get("/records/my")),
+            {
+                "If-None-Match": '"1"',
+                "If-Modified-Since": "Sat, 01 Feb 2020 00:00:00 GMT",
+            },
+        )
+        self.assertEqual(self.cache.validators(None), {})
+
+    def test_renew(self):
+        self.cache.put("/records/my", 200, b"{}", {"ETag": '"1"'})
+        self.clock.now = 15
+        entry = self.cache.renew("/records/my")
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.assertIsNone(self.cache.renew("/records/my/dns"))
+
+    def test_unvalidated_responses_need_a_ttl(self):
+        cache = ResponseCache(ttl=0)
+        cache.put("/records/my", 200, b"{}", {})
+        self.assertIsNone(cache.get("/records/my"))
+        cache.put("/records/my", 200, b"{}", {"ETag": '"1"'})
+        self.assertIsNotNone(cache.get("/records/my"))
+
+    def test_max_entries(self):
+        for path in ("/a", "/b", "/c"):
+            self.cache.put(path, 200, b"{}", {})
+        self.assertIsNone(self.cache.get("/a"))
+        self.assertIsNotNone(self.cache.get("/c"))
+
+    def test_clear(self):
+        self.cache.put("/records/my", 200, b"{}", {})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("/records/my"))
+
+    def test_negative_ttl(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(ttl=-1)
@@ -0,0 +1,56 @@
+import unittest
+from email.utils import formatdate
+from unittest.mock import patch
+
+from postdmarc.retry import RetryPolicy, TokenBucket, parse_retry_after
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test the retry decisions and delays."""
+
+    def test_should_retry(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry("post", 429))
+        self.assertTrue(policy.should_retry("get", 503))
+        self.assertTrue(policy.should_retry("get"))
+        self.assertFalse(policy.should_retry("post", 500))
+        self.assertFalse(policy.should_retry("post"))
+        self.assertFalse(policy.should_retry("get", 404))
+
+    @patch("postdmarc.retry.random.random", return_value=0.0)
+    def test_exponential_backoff(self, mock_random):
+        policy = RetryPolicy(backoff=1.0, max_backoff=3.0)
+        self.assertEqual([policy.delay(n) for n in (1, 2, 3)], [1.0, 2.0, 3.0])
+
+    @patch("postdmarc.retry.random.random", return_value=1.0)
+    def test_jitter(self, mock_random):
+        policy = RetryPolicy(backoff=1.0, jitter=0.25)
+        self.assertEqual(policy.delay(1), 0.75)
+
+    def test_retry_after(self):
+        """Ensure the Retry-After header overrides the backoff."""
+        self.assertEqual(RetryPolicy().delay(1, "7"), 7.0)
+        self.assertEqual(parse_retry_after("-1"), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after(formatdate(0, usegmt=True)), 0.0)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the client-side rate limiter."""
+
+    def test_rate(self):
+        """Ensure requests beyond the burst capacity wait for new tokens."""
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(2.0, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            bucket.acquire()
+        self.assertEqual(waits, [0.5, 0.5])
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, TokenBucket, 0)
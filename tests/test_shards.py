@@ -0,0 +1,38 @@
+import unittest
+from datetime import date
+
+from postdmarc.shards import bisect_window, split_date_range
+
+
+class TestShards(unittest.TestCase):
+    """Test the splitting of listing date ranges into windows."""
+
+    def test_split_date_range(self):
+        self.assertEqual(
+            split_date_range("2020-01-01", "2020-01-08", 3),
+            [
+                (date(2020, 1, 1), date(2020, 1, 4)),
+                (date(2020, 1, 4), date(2020, 1, 7)),
+                (date(2020, 1, 7), date(2020, 1, 8)),
+            ],
+        )
+        self.assertEqual(len(split_date_range("2020-01-01", "2021-01-01", 1)), 366)
+
+    def test_empty_range(self):
+        self.assertEqual(split_date_range("2020-01-08", "2020-01-01", 1), [])
+        self.assertEqual(split_date_range("2020-01-01", "2020-01-01", 1), [])
+
+    def test_invalid_days(self):
+        with self.assertRaises(ValueError):
+            split_date_range("2020-01-01", "2020-01-08", 0)
+
+    def test_bisect_window(self):
+        self.assertEqual(
+            bisect_window((date(2020, 1, 1), date(2020, 1, 6))),
+            [
+                (date(2020, 1, 1), date(2020, 1, 3)),
+                (date(2020, 1, 3), date(2020, 1, 6)),
+            ],
+        )
+        day = (date(2020, 1, 1), date(2020, 1, 2))
+        self.assertEqual(bisect_window(day), [day])
@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from postdmarc import writers
+from postdmarc.store import SELECT_RECORDS, ReportStore
+
+REPORTS = [
+    {
+        "id": 1,
+        "domain": "wildbit.com",
+        "organization_name": "google.com",
+        "date_range_begin": "2020-01-01T00:00:00Z",
+        "date_range_end": "2020-01-01T23:59:59Z",
+        "records": [
+            {"source_ip": "127.0.0.1", "count": 2, "policy_evaluated_spf": "pass"},
+            {"source_ip": "10.0.0.1", "count": 1, "policy_evaluated_spf": "fail"},
+        ],
+    },
+    {
+        "id": 2,
+        "domain": "wildbit.com",
+        "organization_name": "yahoo.com",
+        "date_range_begin": "2020-02-01T00:00:00Z",
+        "date_range_end": "2020-02-01T23:59:59Z",
+        "records": [{"source_ip": "127.0.0.1", "count": 5}],
+    },
+]
+
+
+class TestReportStore(unittest.TestCase):
+    """Test the local report store."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ReportStore(os.path.join(self.tmp.name, "store.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_empty(self):
+        self.assertIsNone(self.store.last_id())
+        self.assertIsNone(self.store.get(1))
+        self.assertEqual(self.store.count(), 0)
+
+    def test_add(self):
+        """Ensure stored reports can be read back and replace earlier copies."""
+        self.store.add([{"id": 2, "domain": "wildbit.com"}, {"id": 1}])
+        self.store.add([{"id": 2, "domain": "postmarkapp.com"}])
+        self.assertEqual(self.store.get(2), {"id": 2, "domain": "postmarkapp.com"})
+        self.assertEqual(self.store.last_id(), 2)
+        self.assertEqual(self.store.count(), 2)
+
+    def test_query(self):
+        """Ensure records can be found by each indexed column."""
+        self.store.add(REPORTS)
+        rows = self.store.query(source_ip="127.0.0.1")
+        self.assertEqual([row["report_id"] for row in rows], [1, 2])
+        self.assertEqual(set(rows[0]), set(writers.COLUMNS))
+        self.assertEqual(rows[0]["organization_name"], "google.com")
+        self.assertEqual(rows[0]["count"], 2)
+
+        rows = self.store.query(source_ip="127.0.0.1", from_date="2020-01-15")
+        self.assertEqual([row["report_id"] for row in rows], [2])
+        rows = self.store.query(to_date="2020-01-15", spf="fail")
+        self.assertEqual([row["source_ip"] for row in rows], ["10.0.0.1"])
+        self.assertEqual(len(self.store.query(organization_name="yahoo.com")), 1)
+        self.assertEqual(len(self.store.query(limit=2)), 2)
+        self.assertRaises(ValueError, self.store.query, country="NL")
+
+    def test_replace_records(self):
+        """Ensure storing a report again doesn't duplicate its records."""
+        self.store.add(REPORTS)
+        self.store.add(REPORTS[:1])
+        self.assertEqual(len(self.store.query()), 3)
+
+    def test_uses_indexes(self):
+        plan = self.store.connection.execute(
+            "EXPLAIN QUERY PLAN " + SELECT_RECORDS + "records.source_ip = ?",
+            ("127.0.0.1",),
+        ).fetchall()
+        self.assertIn("records_source_ip", " ".join(str(step) for step in plan))
+
+    def test_upgrade(self):
+        """Ensure a store of bare reports gets its records indexed."""
+        path = os.path.join(self.tmp.name, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, body TEXT)")
+        connection.executemany(
+            "INSERT INTO reports VALUES (?, ?)",
+            [(report["id"], json.dumps(report)) for report in REPORTS],
+        )
+        connection.commit()
+        connection.close()
+
+        store = ReportStore(path)
+        self.assertEqual(len(store.query(source_ip="127.0.0.1")), 2)
+        self.assertEqual(store.get(2), REPORTS[1])
+        store.close()
@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+
+from postdmarc import writers
+from postdmarc.postdmarc import ResponseTuple
+from postdmarc.summary import ReportSummary, iter_exported_rows
+
+REPORTS = [
+    {
+        "id": 1,
+        "organization_name": "google.com",
+        "date_range_begin": "2020-01-01T00:00:00Z",
+        "records": [
+            {
+                "header_from": "wildbit.com",
+                "source_ip": "127.0.0.1",
+                "count": 5,
+                "policy_evaluated_spf": "pass",
+                "policy_evaluated_dkim": "fail",
+                "policy_evaluated_disposition": "none",
+            },
+            {
+                "header_from": "wildbit.com",
+                "source_ip": "10.0.0.1",
+                "count": 2,
+                "policy_evaluated_spf": "fail",
+                "policy_evaluated_dkim": "fail",
+                "policy_evaluated_disposition": "reject",
+            },
+        ],
+    },
+    {
+        "id": 2,
+        "organization_name": "yahoo.com",
+        "date_range_begin": "2020-01-02T00:00:00Z",
+        "records": [
+            {
+                "header_from": "wildbit.com",
+                "source_ip": "127.0.0.1",
+                "count": 1,
+                "policy_evaluated_spf": "pass",
+                "policy_evaluated_dkim": "pass",
+                "policy_evaluated_disposition": "none",
+            }
+        ],
+    },
+]
+
+
+class TestReportSummary(unittest.TestCase):
+    """Test the aggregation of report records."""
+
+    def summarize(self):
+        summary = ReportSummary()
+        for report in REPORTS:
+            summary.add_report(report)
+        return summary.result()
+
+    def test_totals(self):
+        result = self.summarize()
+        self.assertEqual(result["reports"], 2)
+        self.assertEqual(
+            result["totals"],
+            {
+                "messages": 8,
+                "spf_aligned": 6,
+                "dkim_aligned": 1,
+                "dmarc_pass": 6,
+                "disposition_none": 6,
+                "disposition_quarantine": 0,
+                "disposition_reject": 2,
+            },
+        )
+
+    def test_groupings(self):
+        result = self.summarize()
+        self.assertEqual(list(result["by_source_ip"]), ["127.0.0.1", "10.0.0.1"])
+        self.assertEqual(result["by_source_ip"]["127.0.0.1"]["dmarc_pass"], 6)
+        self.assertEqual(result["by_organization_name"]["yahoo.com"]["messages"], 1)
+        self.assertEqual(result["by_day"]["2020-01-01"]["disposition_reject"], 2)
+        self.assertEqual(result["by_disposition"]["none"]["messages"], 6)
+        self.assertEqual(list(ReportSummary().result(top=1)["by_day"]), [])
+
+    def test_exported_files(self):
+        """Ensure every export format summarizes to the same result."""
+        expected = self.summarize()
+        with tempfile.TemporaryDirectory() as tmp:
+            for output_format in ("json", "jsonl", "csv"):
+                filepath = os.path.join(tmp, f"reports.{output_format}")
+                with writers.open_export(filepath, output_format) as f:
+                    writer = writers.EXPORT_FORMATS[output_format](f)
+                    for report in REPORTS:
+                        writer.write(ResponseTuple(200, report))
+                    writer.close()
+
+                summary = ReportSummary()
+                for row in iter_exported_rows(filepath):
+                    summary.add_row(row)
+                with self.subTest(output_format=output_format):
+                    self.assertEqual(summary.result(), expected)
+
+    def test_plain_json_reports(self):
+        """Ensure files of bare reports, not status code pairs, can be read."""
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "reports.json")
+            with open(filepath, "w") as f:
+                json.dump(REPORTS, f)
+            self.assertEqual(len(list(iter_exported_rows(filepath))), 3)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from postdmarc import writers
+from postdmarc.postdmarc import ResponseTuple
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+REPORT = {
+    "id": 276,
+    "domain": "wildbit.com",
+    "date_range_begin": "2014-04-27T20:00:00Z",
+    "date_range_end": "2014-04-28T19:59:59Z",
+    "organization_name": "google.com",
+    "records": [
+        {
+            "header_from": "wildbit.com",
+            "source_ip": "127.0.0.1",
+            "source_ip_version": 4,
+            "host_name": "example.org.",
+            "count": 3,
+            "policy_evaluated_spf": "fail",
+            "policy_evaluated_dkim": "pass",
+            "policy_evaluated_disposition": "none",
+            "policy_evaluated_reason_type": None,
+            "spf_domain": "example.org",
+            "spf_result": "pass",
+            "dkim_domain": None,
+            "dkim_result": None,
+        },
+        {"source_ip": "10.0.0.1", "count": 1},
+    ],
+}
+
+
+class TestWriters(unittest.TestCase):
+    """Test the export file writers."""
+
+    def test_json_array(self):
+        """Ensure the streamed array matches a single json.dump."""
+        f = io.StringIO()
+        writer = writers.JsonArrayWriter(f)
+        writer.write(ResponseTuple(200, {"id": 1}))
+        writer.write(ResponseTuple(200, {"id": 2}))
+        writer.close()
+        self.assertEqual(f.getvalue(), json.dumps([(200, {"id": 1}), (200, {"id": 2})]))
+
+    def test_json_array_continued(self):
+        f = io.StringIO()
+        f.write('[[200, {"id": 1}]')
+        writer = writers.JsonArrayWriter(f, count=1)
+        writer.write(ResponseTuple(200, {"id": 2}))
+        writer.close()
+        self.assertEqual(json.loads(f.getvalue()), [[200, {"id": 1}], [200, {"id": 2}]])
+
+    def test_flatten_report(self):
+        rows = list(writers.flatten_report(REPORT))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(rows[0]), len(writers.COLUMNS))
+        row = dict(zip(writers.COLUMNS, rows[1]))
+        self.assertEqual(row["report_id"], 276)
+        self.assertEqual(row["organization_name"], "google.com")
+        self.assertEqual(row["source_ip"], "10.0.0.1")
+        self.assertIsNone(row["spf_result"])
+
+    def test_csv(self):
+        f = io.StringIO(newline="")
+        writer = writers.CsvRecordWriter(f)
+        writer.write(ResponseTuple(200, REPORT))
+        writer.close()
+        f.seek(0)
+        rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["source_ip"], "127.0.0.1")
+        self.assertEqual(rows[0]["count"], "3")
+        self.assertEqual(rows[1]["dkim_result"], "")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_npz(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "records.npz")
+            with writers.open_export(filepath, "npz") as f:
+                writer = writers.NpzRecordWriter(f)
+                writer.write(ResponseTuple(200, REPORT))
+                writer.close()
+            with numpy.load(filepath) as columns:
+                self.assertEqual(set(columns.files), set(writers.COLUMNS))
+                self.assertEqual(columns["count"].sum(), 4)
+                self.assertEqual(list(columns["source_ip"]), ["127.0.0.1", "10.0.0.1"])
+                self.assertEqual(columns["report_id"].dtype, numpy.int64)
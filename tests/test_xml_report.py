@@ -0,0 +1,117 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from xml.etree.ElementTree import iterparse
+
+from postdmarc import xml_report
+from postdmarc.writers import RECORD_COLUMNS
+
+REPORT_XML = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<feedback>
+  <report_metadata>
+    <org_name>google.com</org_name>
+    <report_id>xxxxxxxxx</report_id>
+    <date_range><begin>1398643200</begin><end>1398729599</end></date_range>
+  </report_metadata>
+  <policy_published><domain>wildbit.com</domain><p>none</p></policy_published>
+  <record>
+    <row>
+      <source_ip>127.0.0.1</source_ip>
+      <count>3</count>
+      <policy_evaluated>
+        <disposition>none</disposition>
+        <dkim>pass</dkim>
+        <spf>fail</spf>
+        <reason><type>forwarded</type></reason>
+      </policy_evaluated>
+    </row>
+    <identifiers><header_from>wildbit.com</header_from></identifiers>
+    <auth_results>
+      <dkim><domain>wildbit.com</domain><result>pass</result></dkim>
+      <spf><domain>example.org</domain><result>pass</result></spf>
+    </auth_results>
+  </record>
+  <record>
+    <row>
+      <source_ip>2001:db8::1</source_ip>
+      <count>1</count>
+      <policy_evaluated><disposition>reject</disposition></policy_evaluated>
+    </row>
+    <identifiers><header_from>wildbit.com</header_from></identifiers>
+  </record>
+</feedback>
+"""
+
+
+class TestXmlReport(unittest.TestCase):
+    """Test the incremental parsing of raw DMARC XML reports."""
+
+    def test_records(self):
+        records = list(xml_report.iter_xml_records(io.BytesIO(REPORT_XML)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(set(records[0]), set(RECORD_COLUMNS))
+        self.assertEqual(
+            records[0],
+            {
+                "header_from": "wildbit.com",
+                "source_ip": "127.0.0.1",
+                "source_ip_version": 4,
+                "host_name": None,
+                "count": 3,
+                "policy_evaluated_spf": "fail",
+                "policy_evaluated_dkim": "pass",
+                "policy_evaluated_disposition": "none",
+                "policy_evaluated_reason_type": "forwarded",
+                "spf_domain": "example.org",
+                "spf_result": "pass",
+                "dkim_domain": "wildbit.com",
+                "dkim_result": "pass",
+            },
+        )
+        self.assertEqual(records[1]["source_ip_version"], 6)
+        self.assertEqual(records[1]["policy_evaluated_disposition"], "reject")
+        self.assertIsNone(records[1]["spf_result"])
+
+    def test_namespaced_records(self):
+        document = REPORT_XML.replace(
+            b"<feedback>",
+            b'<feedback xmlns="urn:ietf:params:xml:ns:dmarc-2.0">',
+        )
+        records = list(xml_report.iter_xml_records(io.BytesIO(document)))
+        self.assertEqual([record["count"] for record in records], [3, 1])
+
+    def test_file_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = os.path.join(tmp, "report.xml")
+            with open(filepath, "wb") as f:
+                f.write(REPORT_XML)
+            records = list(xml_report.iter_xml_records(filepath))
+        self.assertEqual(len(records), 2)
+
+    def test_bounded_memory(self):
+        """Records are dropped from the tree once they have been yielded.
+
+        The parser reads ahead by a buffer of input, so a few records are in the tree
+        at any time, but never the whole document.
+        """
+        start = REPORT_XML.index(b"<record>")
+        end = REPORT_XML.index(b"</feedback>")
+        document = b"<feedback>" + REPORT_XML[start:end] * 1000 + b"</feedback>"
+        roots = []
+
+        def tracking_iterparse(source, events):
+            for event, element in iterparse(source, events):
+                if not roots:
+                    roots.append(element)
+                yield event, element
+
+        count = largest_tree = 0
+        with patch.object(xml_report, "iterparse", tracking_iterparse):
+            for count, _ in enumerate(
+                xml_report.iter_xml_records(io.BytesIO(document)), 1
+            ):
+                largest_tree = max(largest_tree, len(roots[0]))
+        self.assertEqual(count, 2000)
+        self.assertLess(largest_tree, 100)